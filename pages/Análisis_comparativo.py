@@ -1,4 +1,3 @@
-import sqlite3
 import sys
 from pathlib import Path
 
@@ -13,6 +12,8 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
+from utils.correlacion import correlacion_cruzada, desfase_de_maxima_correlacion
+from utils.datos import cargar_datos
 from utils.peak_matching_access import resumir_desfases_seguro as resumir_desfases
 from utils.ui import (
     aplicar_estilos_generales,
@@ -26,13 +27,7 @@ if runtime_activo():
     st.set_page_config(layout="wide", page_title="Análisis Comparativo")
     aplicar_estilos_generales()
 
-@st.cache_data
-def cargar_datos():
-    with sqlite3.connect('contaminantes.db') as conn:
-        df = pd.read_sql_query("SELECT * FROM calidad_aire", conn, parse_dates=['Fecha'], index_col='Fecha')
-    return df
-
-def realizar_analisis_completo(serie_maestro, serie_esclavo, df_index):
+def realizar_analisis_completo(serie_maestro, serie_esclavo, df_index, mutuo=False):
     # (Cálculos de suavizado, picos, varianza, etc. no cambian)
     s_maestro_suavizada = serie_maestro.rolling(30, center=True, min_periods=1).mean()
     s_esclavo_suavizada = serie_esclavo.rolling(30, center=True, min_periods=1).mean()
@@ -48,6 +43,7 @@ def realizar_analisis_completo(serie_maestro, serie_esclavo, df_index):
         fechas_picos_esclavo,
         ventana_busqueda=90,
         ventana_confiable=45,
+        mutuo=mutuo,
     )
     varianza_desfase = resumen_desfases["varianza"]
     desfase_medio = resumen_desfases["desfase_medio"]
@@ -66,10 +62,10 @@ def realizar_analisis_completo(serie_maestro, serie_esclavo, df_index):
     else:
         sincronia_tendencia = np.nan
     
-    max_corr, mejor_lag = -1, 0
-    for lag in range(-90, 91):
-        corr = serie_maestro.corr(serie_esclavo.shift(lag))
-        if corr > max_corr: max_corr, mejor_lag = corr, lag
+    # Correlación para cada desfase de ±90 días en una sola llamada (en lugar de 181 corr)
+    correlaciones = correlacion_cruzada(serie_maestro, serie_esclavo.reindex(serie_maestro.index), 90)
+    mejor_lag, max_corr = desfase_de_maxima_correlacion(correlaciones)
+    mejor_lag, max_corr = int(mejor_lag), float(max_corr)
 
     # --- NUEVO: Cálculo de Ciclos Acumulados ---
     ciclos_maestro_acum = pd.Series(np.arange(1, len(fechas_picos_maestro) + 1), index=fechas_picos_maestro)
@@ -132,9 +128,20 @@ if runtime_activo():
     st.sidebar.header("Panel de Control")
     contaminante_maestro = st.sidebar.selectbox("Contaminante Maestro (Referencia):", lista_contaminantes, index=4)
     contaminante_esclavo = st.sidebar.selectbox("Contaminante Esclavo (Comparación):", lista_contaminantes, index=5)
+    emparejamiento_mutuo = st.sidebar.checkbox(
+        "Emparejar solo picos mutuamente más cercanos",
+        value=False,
+        help="Descarta los picos disputados en lugar de asignarlos al primer maestro."
+        " Cambia los pares reportados y, por tanto, la varianza del desfase.",
+    )
 
     if contaminante_maestro and contaminante_esclavo:
-        resultados = realizar_analisis_completo(df_datos[contaminante_maestro], df_datos[contaminante_esclavo], df_datos.index)
+        resultados = realizar_analisis_completo(
+            df_datos[contaminante_maestro],
+            df_datos[contaminante_esclavo],
+            df_datos.index,
+            mutuo=emparejamiento_mutuo,
+        )
 
         # --- Tarjetas de métricas clave ---
         sync_tend = resultados['sincronia_tendencia']
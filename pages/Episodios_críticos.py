@@ -1,4 +1,3 @@
-import sqlite3
 import sys
 from dataclasses import dataclass
 from pathlib import Path
@@ -12,6 +11,7 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
+from utils.datos import cargar_datos
 from utils.ui import (
     aplicar_estilos_generales,
     boton_descarga_altair,
@@ -21,15 +21,6 @@ from utils.ui import (
 )
 
 
-@st.cache_data
-def cargar_datos() -> pd.DataFrame:
-    with sqlite3.connect("contaminantes.db") as conn:
-        df = pd.read_sql_query(
-            "SELECT * FROM calidad_aire", conn, parse_dates=["Fecha"], index_col="Fecha"
-        )
-    return df.sort_index()
-
-
 @dataclass
 class Episodio:
     inicio: pd.Timestamp
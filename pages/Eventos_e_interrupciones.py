@@ -1,7 +1,6 @@
 from datetime import date
 from typing import Dict, List, Tuple
 
-import sqlite3
 import sys
 from pathlib import Path
 
@@ -15,6 +14,7 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
+from utils.datos import cargar_datos
 from utils.peak_matching_access import resumir_desfases_seguro as resumir_desfases
 from utils.ui import (
     aplicar_estilos_generales,
@@ -29,15 +29,6 @@ if runtime_activo():
     aplicar_estilos_generales()
 
 
-@st.cache_data
-def cargar_datos() -> pd.DataFrame:
-    with sqlite3.connect("contaminantes.db") as conn:
-        df = pd.read_sql_query(
-            "SELECT * FROM calidad_aire", conn, parse_dates=["Fecha"], index_col="Fecha"
-        )
-    return df.sort_index()
-
-
 def _normalizar_intervalo(inicio: pd.Timestamp, fin: pd.Timestamp) -> Tuple[pd.Timestamp, pd.Timestamp]:
     if inicio > fin:
         inicio, fin = fin, inicio
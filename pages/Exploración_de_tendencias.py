@@ -1,4 +1,3 @@
-import sqlite3
 import sys
 from pathlib import Path
 
@@ -10,6 +9,7 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
+from utils.datos import cargar_datos
 from utils.ui import (
     aplicar_estilos_generales,
     boton_descarga_altair,
@@ -19,18 +19,6 @@ from utils.ui import (
 )
 
 
-@st.cache_data
-def cargar_datos():
-    with sqlite3.connect("contaminantes.db") as conn:
-        df = pd.read_sql_query(
-            "SELECT * FROM calidad_aire",
-            conn,
-            parse_dates=["Fecha"],
-            index_col="Fecha",
-        )
-    return df.sort_index()
-
-
 if runtime_activo():
     st.set_page_config(layout="wide", page_title="Exploración de tendencias")
     aplicar_estilos_generales()
@@ -1,18 +1,19 @@
-import sqlite3
+import hashlib
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
-import seaborn as sns
 import streamlit as st
-from scipy.signal import find_peaks
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
+from utils.correlacion import correlacion_cruzada_matricial, desfase_de_maxima_correlacion
+from utils.datos import cargar_datos
 from utils.peak_matching_access import resumir_desfases_seguro as resumir_desfases
 from utils.ui import (
     aplicar_estilos_generales,
@@ -21,62 +22,112 @@ from utils.ui import (
     runtime_activo,
 )
 
+CACHE_DIR = PROJECT_ROOT / "cache"
+METRICAS = ("tendencia", "varianza", "desfase")
+# Subir este número cada vez que cambie el cálculo de una métrica: forma parte del nombre
+# de los archivos en ``CACHE_DIR``, así que las matrices de versiones anteriores se ignoran.
+VERSION_MATRICES = 2
+
 if runtime_activo():
     st.set_page_config(layout="wide", page_title="Matriz de Sincronía")
     aplicar_estilos_generales()
 
-@st.cache_data
-def cargar_datos():
-    with sqlite3.connect('contaminantes.db') as conn:
-        df = pd.read_sql_query("SELECT * FROM calidad_aire", conn, parse_dates=['Fecha'], index_col='Fecha')
-    return df
+def _suavizar_y_derivar(valores, ventana=15):
+    """Media móvil centrada seguida de ``pct_change`` sobre una matriz ``(T, n)``.
+
+    Sigue a ``serie.rolling(ventana, center=True).mean().pct_change(fill_method=None)``
+    aplicado a cada columna (mismas posiciones de NaN), pero en una sola pasada vectorizada
+    sobre todas las columnas en lugar de encadenar tres operaciones de pandas por contaminante.
+
+    A propósito no es idéntico: cuando el valor que entra a la ventana es igual al que sale
+    aquí la derivada es exactamente 0, mientras que pandas deja un residuo de redondeo
+    (±1e-16) cuyo signo cuenta como subida o bajada en :func:`_porcentaje_misma_direccion`.
+    Por eso los porcentajes de tendencia pueden moverse unas décimas respecto a pandas.
+    """
+    valores = np.asarray(valores, dtype=float)
+    derivadas = np.full(valores.shape, np.nan)
+    # Sin ``min_periods`` pandas exige la ventana completa; hacen falta dos ventanas seguidas.
+    if valores.shape[0] <= ventana:
+        return derivadas
+
+    medias = np.lib.stride_tricks.sliding_window_view(valores, ventana, axis=0).mean(axis=-1)
+    # Entre dos ventanas consecutivas solo cambian el valor que entra y el que sale; tomar
+    # la variación de ahí (y no restando medias) deja ceros exactos en tramos constantes.
+    variacion = (valores[ventana:] - valores[:-ventana]) / ventana
+    inicio = ventana // 2 + 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        derivadas[inicio : inicio + variacion.shape[0]] = variacion / medias[:-1]
+    return derivadas
+
+
+def _porcentaje_misma_direccion(derivadas):
+    """Porcentaje de instantes en los que cada par de columnas cambia en la misma dirección.
+
+    Los NaN nunca coinciden, igual que ``np.sign(d1) == np.sign(d2)``. El conteo de
+    coincidencias de todos los pares se obtiene con un producto matricial por signo.
+    """
+    signos = np.sign(derivadas)
+    coincidencias = np.zeros((signos.shape[1], signos.shape[1]))
+    for signo in (-1.0, 0.0, 1.0):
+        indicador = (signos == signo).astype(float)
+        coincidencias += indicador.T @ indicador
+    return coincidencias / signos.shape[0] * 100
+
+
+def _huella_datos(df):
+    """Resume el contenido de ``df`` (valores, fechas y columnas) en un hash hexadecimal.
+
+    Se usa como ``hash_funcs`` de ``st.cache_data`` y como nombre de la caché en disco.
+    ``hash_pandas_object`` hashea el contenido de cada celda (también las de tipo objeto,
+    cuyos bytes crudos serían punteros) y sigue siendo mucho más barato que el serializado
+    genérico que Streamlit aplica a un DataFrame en cada rerun.
+    """
+    filas = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    huella = hashlib.blake2b(np.ascontiguousarray(filas).tobytes())
+    huella.update(str(df.columns.tolist()).encode())
+    return huella.hexdigest()
+
 
-@st.cache_data
 def calcular_matriz(df, metrica):
     contaminantes = df.columns
     matriz = pd.DataFrame(index=contaminantes, columns=contaminantes, dtype=float)
 
-    # Precalculamos series suavizadas, derivadas y picos por contaminante para reutilizarlos
-    series_originales = {contaminante: df[contaminante] for contaminante in contaminantes}
-    series_suavizadas = {
-        contaminante: series_originales[contaminante].rolling(30, center=True, min_periods=1).mean()
-        for contaminante in contaminantes
-    }
-    derivadas_suavizadas = {
-        contaminante: series_suavizadas[contaminante]
-        .rolling(15, center=True)
-        .mean()
-        .pct_change(fill_method=None)
-        for contaminante in contaminantes
-    }
-    picos_indices = {}
+    if metrica == 'desfase':
+        # Correlación cruzada de todos los pares (±60 días) con un solo lote de FFT
+        correlaciones = correlacion_cruzada_matricial(df.to_numpy(dtype=float), 60)
+        desfases, _ = desfase_de_maxima_correlacion(correlaciones)
+        np.fill_diagonal(desfases, 0)
+        matriz.loc[:, :] = desfases
+        return matriz
+
+    # Suavizamos todas las columnas en una sola pasada y reutilizamos el resultado
+    suavizadas = df.rolling(30, center=True, min_periods=1).mean()
+
+    if metrica == 'tendencia':
+        porcentajes = _porcentaje_misma_direccion(_suavizar_y_derivar(suavizadas.to_numpy(dtype=float), 15))
+        np.fill_diagonal(porcentajes, 100)
+        matriz.loc[:, :] = porcentajes
+        return matriz
+
     picos_fechas = {}
-    for contaminante, serie_suavizada in series_suavizadas.items():
-        indices, _ = find_peaks(
-            serie_suavizada,
-            distance=30,
-            height=serie_suavizada.mean(),
-        )
-        picos_indices[contaminante] = indices
-        picos_fechas[contaminante] = serie_suavizada.index[indices]
+    if metrica == 'varianza':
+        from scipy.signal import find_peaks  # importación perezosa: solo la usa esta métrica
+
+        # ``find_peaks`` sobre columnas de NumPy evita envolver cada serie en pandas;
+        # las medias de todas las columnas salen de una sola reducción.
+        valores_suavizados = suavizadas.to_numpy(dtype=float)
+        medias = np.nanmean(valores_suavizados, axis=0)
+        for j, contaminante in enumerate(contaminantes):
+            indices, _ = find_peaks(valores_suavizados[:, j], distance=30, height=medias[j])
+            picos_fechas[contaminante] = suavizadas.index[indices]
 
     for c1 in contaminantes:
         for c2 in contaminantes:
             if c1 == c2:
-                if metrica == 'tendencia': matriz.loc[c1, c2] = 100
-                elif metrica == 'varianza': matriz.loc[c1, c2] = 0
-                elif metrica == 'desfase': matriz.loc[c1, c2] = 0
+                if metrica == 'varianza': matriz.loc[c1, c2] = 0
                 continue
 
-            s1_suavizada = series_suavizadas[c1]
-            s2_suavizada = series_suavizadas[c2]
-
-            if metrica == 'tendencia':
-                derivada1 = derivadas_suavizadas[c1]
-                derivada2 = derivadas_suavizadas[c2]
-                valor = np.mean(np.sign(derivada1) == np.sign(derivada2)) * 100
-
-            elif metrica == 'varianza':
+            if metrica == 'varianza':
                 fechas_picos1 = picos_fechas[c1]
                 fechas_picos2 = picos_fechas[c2]
                 resumen = resumir_desfases(
@@ -84,25 +135,105 @@ def calcular_matriz(df, metrica):
                     fechas_picos2,
                     ventana_busqueda=90,
                     ventana_confiable=45,
+                    incluir_pares=False,
                 )
                 valor = resumen["varianza"]
-
-            elif metrica == 'desfase':
-                # --- NUEVO CÁLCULO: Correlación Cruzada para encontrar el mejor lag ---
-                max_corr, mejor_lag = -1, 0
-                serie1_original = series_originales[c1]
-                serie2_original = series_originales[c2]
-                for lag in range(-60, 61): # Rango de +/- 60 días
-                    corr = serie1_original.corr(serie2_original.shift(lag))
-                    if corr > max_corr:
-                        max_corr = corr
-                        mejor_lag = lag
-                valor = mejor_lag
             
             matriz.loc[c1, c2] = valor
             
     return matriz
 
+
+def _matriz_valida(matriz, df):
+    """Indica si ``matriz`` es una matriz cuadrada de flotantes sobre las columnas de ``df``."""
+    return (
+        isinstance(matriz, pd.DataFrame)
+        and matriz.shape == (len(df.columns), len(df.columns))
+        and matriz.index.equals(df.columns)
+        and matriz.columns.equals(df.columns)
+        and all(pd.api.types.is_float_dtype(tipo) for tipo in matriz.dtypes)
+    )
+
+
+def obtener_matriz(df, metrica):
+    """Devuelve la matriz de ``metrica`` reutilizando la copia persistida en disco si existe.
+
+    Las matrices se guardan en ``cache/{huella}_{metrica}_v{VERSION_MATRICES}.pkl`` para que
+    un reinicio de Streamlit (o varios procesos sirviendo la app) no tengan que recalcularlas.
+    Una copia que no corresponde a las columnas de ``df`` se descarta y se recalcula.
+    """
+    ruta = CACHE_DIR / f"{_huella_datos(df)}_{metrica}_v{VERSION_MATRICES}.pkl"
+    if ruta.exists():
+        try:
+            matriz = pd.read_pickle(ruta)
+        except Exception:
+            matriz = None  # Archivo corrupto: se recalcula y sobrescribe.
+        if _matriz_valida(matriz, df):
+            return matriz
+
+    matriz = calcular_matriz(df, metrica)
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        ruta_temporal = ruta.with_suffix(f".{os.getpid()}.tmp")
+        matriz.to_pickle(ruta_temporal)
+        os.replace(ruta_temporal, ruta)
+    except OSError:
+        pass  # Sin permisos de escritura: se conserva solo la caché en memoria.
+    return matriz
+
+
+@st.cache_data(hash_funcs={pd.DataFrame: _huella_datos})
+def calcular_matrices(df):
+    """Calcula las tres matrices de la página en paralelo, en el orden de ``METRICAS``.
+
+    Las métricas son independientes y su trabajo pesado (productos matriciales, FFT y
+    ``find_peaks``) suelta el GIL, así que el tiempo total se acerca al de la más lenta.
+    La caché de Streamlit necesita el contexto del script, así que solo la aplica este
+    envoltorio; los hilos llaman a :func:`calcular_matriz` directamente.
+    """
+    with ThreadPoolExecutor(max_workers=len(METRICAS)) as ejecutor:
+        futuros = [
+            ejecutor.submit(obtener_matriz, df, metrica)
+            for metrica in METRICAS
+        ]
+        return tuple(futuro.result() for futuro in futuros)
+
+
+def _escala_colores(nombre, invertir=False):
+    """Convierte una paleta de seaborn en una escala de colores de Plotly."""
+    import seaborn as sns  # importación perezosa: solo se necesita al dibujar
+
+    paleta = sns.color_palette(nombre, as_cmap=False, n_colors=256)
+    if invertir:
+        paleta = paleta[::-1]
+    return [
+        (i / (len(paleta) - 1), f"rgb({int(r * 255)},{int(g * 255)},{int(b * 255)})")
+        for i, (r, g, b) in enumerate(paleta)
+    ]
+
+
+def _heatmap(matriz, titulo, **propiedades):
+    """Construye el mapa de calor de una matriz contaminante contra contaminante."""
+    import plotly.graph_objects as go  # importación perezosa: solo se necesita al dibujar
+
+    figura = go.Figure(
+        data=[
+            go.Heatmap(
+                z=matriz.to_numpy(dtype=float),
+                x=matriz.columns,
+                y=matriz.index,
+                textfont=dict(color="black"),
+                **propiedades,
+            )
+        ]
+    )
+    figura.update_layout(
+        title=titulo,
+        xaxis_title="Contaminante (columna)",
+        yaxis_title="Contaminante (fila)",
+    )
+    return figura
+
 if runtime_activo():
     mostrar_encabezado(
         "Matriz de sincronía global",
@@ -113,36 +244,7 @@ if runtime_activo():
 
     df_datos = cargar_datos()
 
-    matriz_tendencia = calcular_matriz(df_datos, 'tendencia')
-    tendencia_values = matriz_tendencia.to_numpy(dtype=float)
-    tendencia_text = np.empty_like(tendencia_values, dtype=object)
-    mask_tendencia = ~np.isnan(tendencia_values)
-    tendencia_text[mask_tendencia] = np.vectorize(lambda v: f"{v:.1f}%")(tendencia_values[mask_tendencia])
-    tendencia_text[~mask_tendencia] = ""
-
-    matriz_varianza = calcular_matriz(df_datos, 'varianza')
-    varianza_values = matriz_varianza.to_numpy(dtype=float)
-    varianza_text = np.empty_like(varianza_values, dtype=object)
-    mask_varianza = ~np.isnan(varianza_values)
-    varianza_text[mask_varianza] = np.vectorize(lambda v: f"{v:.1f}")(varianza_values[mask_varianza])
-    varianza_text[~mask_varianza] = ""
-    magma_reversed = sns.color_palette("magma", as_cmap=False, n_colors=256)[::-1]
-    magma_colorscale = [
-        (i / (len(magma_reversed) - 1), f"rgb({int(r * 255)},{int(g * 255)},{int(b * 255)})")
-        for i, (r, g, b) in enumerate(magma_reversed)
-    ]
-
-    matriz_desfase = calcular_matriz(df_datos, 'desfase')
-    desfase_values = matriz_desfase.to_numpy(dtype=float)
-    desfase_text = np.empty_like(desfase_values, dtype=object)
-    mask_desfase = ~np.isnan(desfase_values)
-    desfase_text[mask_desfase] = np.vectorize(lambda v: f"{v:.0f}")(desfase_values[mask_desfase])
-    desfase_text[~mask_desfase] = ""
-    vlag_palette = sns.color_palette("vlag", as_cmap=False, n_colors=256)
-    vlag_colorscale = [
-        (i / (len(vlag_palette) - 1), f"rgb({int(r * 255)},{int(g * 255)},{int(b * 255)})")
-        for i, (r, g, b) in enumerate(vlag_palette)
-    ]
+    matriz_tendencia, matriz_varianza, matriz_desfase = calcular_matrices(df_datos)
 
     pestañas = st.tabs([
         "Sincronía de tendencia",
@@ -151,30 +253,20 @@ if runtime_activo():
     ])
 
     with pestañas[0]:
-        fig1 = go.Figure(
-            data=[
-                go.Heatmap(
-                    z=tendencia_values,
-                    x=matriz_tendencia.columns,
-                    y=matriz_tendencia.index,
-                    colorscale="Viridis",
-                    text=tendencia_text,
-                    texttemplate="%{text}",
-                    textfont=dict(color="black"),
-                    hovertemplate=(
-                        "Contaminante fila: %{y}<br>Contaminante columna: %{x}<br>"
-                        "Sincronía: %{z:.1f}%<extra></extra>"
-                    ),
-                    colorbar=dict(title="%"),
-                    zmin=np.nanmin(tendencia_values),
-                    zmax=np.nanmax(tendencia_values),
-                )
-            ]
-        )
-        fig1.update_layout(
-            title="Porcentaje de tiempo con la misma dirección de cambio",
-            xaxis_title="Contaminante (columna)",
-            yaxis_title="Contaminante (fila)",
+        # Las etiquetas de cada celda se formatean en el navegador a partir de ``z`` (texttemplate);
+        # Plotly deja sin valor las celdas NaN, así que no hace falta armar matrices de texto.
+        fig1 = _heatmap(
+            matriz_tendencia,
+            "Porcentaje de tiempo con la misma dirección de cambio",
+            colorscale="Viridis",
+            texttemplate="%{z:.1f}%",
+            hovertemplate=(
+                "Contaminante fila: %{y}<br>Contaminante columna: %{x}<br>"
+                "Sincronía: %{z:.1f}%<extra></extra>"
+            ),
+            colorbar=dict(title="%"),
+            zmin=np.nanmin(matriz_tendencia.to_numpy(dtype=float)),
+            zmax=np.nanmax(matriz_tendencia.to_numpy(dtype=float)),
         )
         st.plotly_chart(fig1, use_container_width=True)
         boton_descarga_plotly(
@@ -188,28 +280,16 @@ if runtime_activo():
         )
 
     with pestañas[1]:
-        fig2 = go.Figure(
-            data=[
-                go.Heatmap(
-                    z=varianza_values,
-                    x=matriz_varianza.columns,
-                    y=matriz_varianza.index,
-                    colorscale=magma_colorscale,
-                    text=varianza_text,
-                    texttemplate="%{text}",
-                    textfont=dict(color="black"),
-                    hovertemplate=(
-                        "Contaminante fila: %{y}<br>Contaminante columna: %{x}<br>"
-                        "Varianza del desfase: %{z:.1f} días²<extra></extra>"
-                    ),
-                    colorbar=dict(title="días²"),
-                )
-            ]
-        )
-        fig2.update_layout(
-            title="Dispersión de desfases entre picos emparejados",
-            xaxis_title="Contaminante (columna)",
-            yaxis_title="Contaminante (fila)",
+        fig2 = _heatmap(
+            matriz_varianza,
+            "Dispersión de desfases entre picos emparejados",
+            colorscale=_escala_colores("magma", invertir=True),
+            texttemplate="%{z:.1f}",
+            hovertemplate=(
+                "Contaminante fila: %{y}<br>Contaminante columna: %{x}<br>"
+                "Varianza del desfase: %{z:.1f} días²<extra></extra>"
+            ),
+            colorbar=dict(title="días²"),
         )
         st.plotly_chart(fig2, use_container_width=True)
         boton_descarga_plotly(
@@ -223,29 +303,17 @@ if runtime_activo():
         )
 
     with pestañas[2]:
-        fig3 = go.Figure(
-            data=[
-                go.Heatmap(
-                    z=desfase_values,
-                    x=matriz_desfase.columns,
-                    y=matriz_desfase.index,
-                    colorscale=vlag_colorscale,
-                    zmid=0,
-                    text=desfase_text,
-                    texttemplate="%{text}",
-                    textfont=dict(color="black"),
-                    hovertemplate=(
-                        "Contaminante fila: %{y}<br>Contaminante columna: %{x}<br>"
-                        "Desfase óptimo: %{z:.0f} días<extra></extra>"
-                    ),
-                    colorbar=dict(title="días"),
-                )
-            ]
-        )
-        fig3.update_layout(
-            title="Desfase que maximiza la correlación",
-            xaxis_title="Contaminante (columna)",
-            yaxis_title="Contaminante (fila)",
+        fig3 = _heatmap(
+            matriz_desfase,
+            "Desfase que maximiza la correlación",
+            colorscale=_escala_colores("vlag"),
+            zmid=0,
+            texttemplate="%{z:.0f}",
+            hovertemplate=(
+                "Contaminante fila: %{y}<br>Contaminante columna: %{x}<br>"
+                "Desfase óptimo: %{z:.0f} días<extra></extra>"
+            ),
+            colorbar=dict(title="días"),
         )
         st.plotly_chart(fig3, use_container_width=True)
         boton_descarga_plotly(
@@ -0,0 +1,51 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from utils.correlacion import (
+    correlacion_cruzada,
+    correlacion_cruzada_matricial,
+    desfase_de_maxima_correlacion,
+)
+
+
+class CorrelacionCruzadaTests(unittest.TestCase):
+    def test_equivale_a_corr_de_pandas_con_shift(self):
+        generador = np.random.default_rng(3)
+        valores = generador.normal(size=(80, 3)).cumsum(axis=0)
+        valores[generador.random(valores.shape) < 0.1] = np.nan
+        df = pd.DataFrame(valores)
+
+        correlaciones = correlacion_cruzada_matricial(valores, 10)
+
+        for i in range(3):
+            for j in range(3):
+                esperado = [df[i].corr(df[j].shift(lag)) for lag in range(-10, 11)]
+                np.testing.assert_allclose(correlaciones[i, j], esperado, atol=1e-10)
+
+    def test_version_por_pares_coincide_con_pandas(self):
+        generador = np.random.default_rng(4)
+        serie_a = pd.Series(generador.normal(size=120).cumsum())
+        serie_b = pd.Series(generador.normal(size=120).cumsum())
+        serie_a.iloc[::9] = np.nan
+
+        correlaciones = correlacion_cruzada(serie_a, serie_b, 15)
+
+        esperado = [serie_a.corr(serie_b.shift(lag)) for lag in range(-15, 16)]
+        np.testing.assert_allclose(correlaciones, esperado, atol=1e-10)
+
+    def test_detecta_el_desfase_de_una_serie_retrasada(self):
+        generador = np.random.default_rng(5)
+        base = generador.normal(size=200)
+        valores = np.column_stack([base, np.roll(base, 7)])
+
+        desfases, maximos = desfase_de_maxima_correlacion(correlacion_cruzada_matricial(valores, 20))
+
+        self.assertEqual(desfases[0, 1], -7)
+        self.assertEqual(desfases[1, 0], 7)
+        self.assertAlmostEqual(maximos[0, 1], 1.0, places=6)
+
+
+if __name__ == "__main__":
+    unittest.main()
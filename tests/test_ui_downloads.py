@@ -1,4 +1,5 @@
 import unittest
+from unittest import mock
 
 from utils import downloads, ui
 
@@ -15,6 +16,43 @@ class DownloadHelpersTest(unittest.TestCase):
         downloads.boton_descarga_plotly(object(), "grafica.png")
         downloads.boton_descarga_altair(object(), "grafica.html")
 
+    def test_descarga_diferida_que_falla_entrega_el_respaldo(self):
+        fallos = []
+
+        def generar():
+            raise RuntimeError("Chrome no arrancó")
+
+        with self.assertLogs(downloads.__name__, level="ERROR"):
+            contenido = downloads._diferir(generar, b"", lambda: fallos.append(True))()
+
+        self.assertEqual(contenido, b"")
+        self.assertEqual(fallos, [True])
+
+    def test_png_diferido_que_falla_entrega_aviso_y_pasa_a_html(self):
+        with mock.patch.object(downloads, "_exportar_imagen", side_effect=RuntimeError), \
+                mock.patch.object(downloads, "_PNG_FUNCIONA", True), \
+                self.assertLogs(downloads.__name__, level="ERROR"):
+            contenido = downloads._png_diferido(object(), "png")()
+            png_funciona = downloads._PNG_FUNCIONA
+
+        self.assertTrue(contenido)
+        self.assertIn("HTML", contenido.decode("utf-8"))
+        self.assertIs(png_funciona, False)
+
+
+class TextoRicoTests(unittest.TestCase):
+    def test_convierte_negritas_y_cursivas_como_las_expresiones_regulares(self):
+        casos = {
+            "a **b** *c* <x>\nd": "a <strong>b</strong> <em>c</em> &lt;x&gt;<br>d",
+            "***a**": "<strong>*a</strong>",
+            "**a\nb** *c*": "**a<br>b<em>* </em>c*",
+            "** ****": "<strong> </strong>**",
+            "sin marcas": "sin marcas",
+        }
+        for texto, esperado in casos.items():
+            with self.subTest(texto=texto):
+                self.assertEqual(ui._render_texto_rico(texto), esperado)
+
 
 if __name__ == "__main__":
     unittest.main()
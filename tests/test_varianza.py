@@ -1,9 +1,14 @@
+import tempfile
 import unittest
+from pathlib import Path
+from unittest import mock
+
 import pandas as pd
 import numpy as np
 
 from pages import Matriz_de_sincronía as matriz_module
 from pages import Análisis_comparativo as comparativo_module
+from utils import peak_matching
 from utils.peak_matching import calcular_desfases_entre_picos, resumir_desfases
 from utils.peak_matching_access import resumir_desfases_seguro
 
@@ -20,7 +25,7 @@ class MatrizVarianzaTests(unittest.TestCase):
             'PM2_5': serie_base,
         }, index=fechas)
 
-        matriz = matriz_module.calcular_matriz.__wrapped__(df, 'varianza')
+        matriz = matriz_module.calcular_matriz(df, 'varianza')
         valor_varianza = matriz.loc['PM10', 'PM2_5']
 
         self.assertAlmostEqual(valor_varianza, 0.0, places=6)
@@ -38,11 +43,99 @@ class MatrizVarianzaTests(unittest.TestCase):
             'ESCLAVO': serie_esclavo,
         }, index=fechas)
 
-        matriz = matriz_module.calcular_matriz.__wrapped__(df, 'varianza')
+        matriz = matriz_module.calcular_matriz(df, 'varianza')
         valor_varianza = matriz.loc['MAESTRO', 'ESCLAVO']
 
         self.assertLess(valor_varianza, 1.0)
 
+    def test_matriz_persistida_en_disco_se_reutiliza(self):
+        fechas = pd.date_range('2020-01-01', periods=120, freq='D')
+        df = pd.DataFrame({
+            'A': np.sin(np.linspace(0, 8, len(fechas))),
+            'B': np.cos(np.linspace(0, 8, len(fechas))),
+        }, index=fechas)
+
+        with tempfile.TemporaryDirectory() as directorio, \
+                mock.patch.object(matriz_module, 'CACHE_DIR', Path(directorio)):
+            primera = matriz_module.obtener_matriz(df, 'tendencia')
+            self.assertEqual(len(list(Path(directorio).glob(f'*_tendencia_v{matriz_module.VERSION_MATRICES}.pkl'))), 1)
+
+            with mock.patch.object(matriz_module, 'calcular_matriz', side_effect=AssertionError):
+                segunda = matriz_module.obtener_matriz(df, 'tendencia')
+
+        pd.testing.assert_frame_equal(primera, segunda)
+
+    def test_matriz_persistida_invalida_se_recalcula(self):
+        fechas = pd.date_range('2020-01-01', periods=120, freq='D')
+        df = pd.DataFrame({
+            'A': np.sin(np.linspace(0, 8, len(fechas))),
+            'B': np.cos(np.linspace(0, 8, len(fechas))),
+        }, index=fechas)
+
+        with tempfile.TemporaryDirectory() as directorio, \
+                mock.patch.object(matriz_module, 'CACHE_DIR', Path(directorio)):
+            esperada = matriz_module.obtener_matriz(df, 'tendencia')
+            ruta, = Path(directorio).glob('*_tendencia_v*.pkl')
+            pd.DataFrame({'X': [1.0]}, index=['X']).to_pickle(ruta)
+
+            obtenida = matriz_module.obtener_matriz(df, 'tendencia')
+
+        pd.testing.assert_frame_equal(obtenida, esperada)
+
+    def test_huella_depende_del_contenido_y_no_de_la_memoria(self):
+        fechas = pd.date_range('2020-01-01', periods=3, freq='D')
+        df = pd.DataFrame({'A': [1.0, 2.0, 3.0], 'B': ['x', 'y', 'z']}, index=fechas)
+        copia = pd.DataFrame({'A': [1.0, 2.0, 3.0], 'B': [''.join(['x']), 'y', 'z']}, index=fechas)
+        distinta = df.assign(A=[1.0, 2.0, 4.0])
+
+        self.assertEqual(matriz_module._huella_datos(df), matriz_module._huella_datos(copia))
+        self.assertNotEqual(matriz_module._huella_datos(df), matriz_module._huella_datos(distinta))
+
+    def test_matrices_en_paralelo_coinciden_con_las_individuales(self):
+        fechas = pd.date_range('2020-01-01', periods=200, freq='D')
+        df = pd.DataFrame({
+            'A': np.sin(np.linspace(0, 12, len(fechas))) + 2,
+            'B': np.cos(np.linspace(0, 12, len(fechas))) + 2,
+        }, index=fechas)
+
+        with tempfile.TemporaryDirectory() as directorio, \
+                mock.patch.object(matriz_module, 'CACHE_DIR', Path(directorio)):
+            matrices = matriz_module.calcular_matrices.__wrapped__(df)
+
+        for metrica, matriz in zip(matriz_module.METRICAS, matrices):
+            esperada = matriz_module.calcular_matriz(df, metrica)
+            pd.testing.assert_frame_equal(matriz, esperada)
+
+
+class MatrizTendenciaTests(unittest.TestCase):
+    def test_derivada_fusionada_equivale_a_pandas(self):
+        generador = np.random.default_rng(7)
+        valores = generador.integers(0, 5, size=(200, 3)).astype(float)
+        valores[generador.random(valores.shape) < 0.05] = np.nan
+
+        esperado = (
+            pd.DataFrame(valores).rolling(15, center=True).mean().pct_change(fill_method=None).to_numpy()
+        )
+        obtenido = matriz_module._suavizar_y_derivar(valores, 15)
+
+        np.testing.assert_allclose(obtenido, esperado, rtol=1e-9, atol=1e-12)
+
+    def test_derivada_es_cero_exacto_si_la_ventana_no_cambia(self):
+        # Un ciclo de 15 valores hace que entre y salga el mismo dato en cada paso: pandas deja
+        # residuos de ±1e-16 ahí, la versión fusionada devuelve ceros exactos.
+        ciclo = [6.1, 5.9, 6.03, 6.1, 5.43, 6.2, 6.3, 5.5, 6.6, 6.1, 5.1, 6.7, 7.1, 6.1, 5.2]
+        valores = np.r_[np.tile(ciclo, 4), [np.nan], np.full(20, 6.1)][:, None]
+
+        obtenido = matriz_module._suavizar_y_derivar(valores, 15)[:, 0]
+        esperado_pandas = (
+            pd.DataFrame(valores).rolling(15, center=True).mean().pct_change(fill_method=None).to_numpy()[:, 0]
+        )
+
+        np.testing.assert_array_equal(np.isnan(obtenido), np.isnan(esperado_pandas))
+        np.testing.assert_array_equal(obtenido[8:53], 0.0)
+        self.assertTrue(np.isnan(obtenido[53:69]).all())  # Toda ventana que toca el NaN
+        np.testing.assert_array_equal(obtenido[69:74], 0.0)
+
 
 class AnalisisComparativoTests(unittest.TestCase):
     def test_varianza_cero_en_series_identicas(self):
@@ -81,6 +174,44 @@ class PeakMatchingTests(unittest.TestCase):
             ],
         )
 
+    def test_esclavo_disputado_queda_con_el_primer_maestro(self):
+        fechas_maestro = pd.to_datetime(['2020-01-01', '2020-01-04', '2020-02-01'])
+        fechas_esclavo = pd.to_datetime(['2020-01-03', '2020-01-20', '2020-02-02'])
+
+        desfases = calcular_desfases_entre_picos(fechas_maestro, fechas_esclavo, ventana_maxima_dias=30)
+
+        # El segundo maestro también está más cerca del 3 de enero, pero ya fue tomado.
+        self.assertEqual(desfases, [2, 16, 1])
+
+    def test_busqueda_vectorizada_equivale_a_get_indexer_nearest(self):
+        generador = np.random.default_rng(11)
+        base = pd.Timestamp('2020-01-01')
+        # Esclavos en múltiplos de 4 y maestros en días impares: nunca quedan a la misma
+        # distancia de dos esclavos, así que el criterio de desempate no interviene.
+        dias_esclavo = np.sort(generador.choice(100, 25, replace=False)) * 4
+        dias_maestro = np.sort(generador.integers(0, 200, 40)) * 2 + 1
+        esclavo = base + pd.to_timedelta(dias_esclavo, unit='D')
+        maestro = base + pd.to_timedelta(dias_maestro, unit='D')
+
+        indices, desfases = peak_matching._mas_cercano(maestro.as_unit('ns').asi8, esclavo.as_unit('ns').asi8)
+
+        np.testing.assert_array_equal(indices, esclavo.get_indexer(maestro, method='nearest'))
+        np.testing.assert_array_equal(desfases, (esclavo[indices] - maestro).days)
+
+    def test_modo_mutuo_descarta_esclavos_disputados(self):
+        fechas_maestro = pd.to_datetime(['2020-01-01', '2020-01-04', '2020-02-01'])
+        fechas_esclavo = pd.to_datetime(['2020-01-03', '2020-01-20', '2020-02-02'])
+
+        desfases, pares = calcular_desfases_entre_picos(
+            fechas_maestro, fechas_esclavo, ventana_maxima_dias=30, return_pares=True, mutuo=True
+        )
+        resumen = resumir_desfases_seguro(fechas_maestro, fechas_esclavo, ventana_busqueda=30, mutuo=True)
+
+        # El 3 de enero está más cerca del segundo maestro, y el 20 de enero de ninguno.
+        self.assertEqual(desfases, [-1, 1])
+        self.assertEqual(pares[0][:2], (pd.Timestamp('2020-01-04'), pd.Timestamp('2020-01-03')))
+        self.assertEqual(resumen['pares'], pares)
+
     def test_resumir_desfases_filtra_desviaciones_extremas(self):
         fechas_maestro = pd.to_datetime(['2020-01-01', '2020-03-01', '2020-06-01'])
         fechas_esclavo = pd.to_datetime(['2020-01-02', '2020-03-03', '2020-07-30'])
@@ -96,6 +227,47 @@ class PeakMatchingTests(unittest.TestCase):
         self.assertEqual([desfase for *_, desfase in resumen['pares_descartados']], [59])
         self.assertAlmostEqual(resumen['varianza'], 0.25, places=6)
 
+    def test_resumir_desfases_guarda_pares_por_columnas(self):
+        fechas_maestro = pd.to_datetime(['2020-06-01', '2020-01-01', '2020-03-01'])
+        fechas_esclavo = pd.to_datetime(['2020-03-03', '2020-07-30', '2020-01-02'])
+
+        resumen = resumir_desfases(
+            fechas_maestro, fechas_esclavo, ventana_busqueda=120, ventana_confiable=45
+        )
+
+        pd.testing.assert_index_equal(
+            resumen['fechas_maestro'], pd.to_datetime(['2020-01-01', '2020-03-01', '2020-06-01'])
+        )
+        np.testing.assert_array_equal(resumen['desfases_dias'], [1, 2, 59])
+        np.testing.assert_array_equal(resumen['mascara_confiable'], [True, True, False])
+        self.assertEqual(
+            resumen['pares_descartados'],
+            [(pd.Timestamp('2020-06-01'), pd.Timestamp('2020-07-30'), 59)],
+        )
+        self.assertEqual(len(resumen['pares']), 3)
+
+    def test_resumir_desfases_sin_pares_conserva_las_metricas(self):
+        fechas_maestro = pd.to_datetime(['2020-06-01', '2020-01-01', '2020-03-01'])
+        fechas_esclavo = pd.to_datetime(['2020-03-03', '2020-07-30', '2020-01-02'])
+
+        completo = resumir_desfases(fechas_maestro, fechas_esclavo, ventana_busqueda=120)
+        resumen = resumir_desfases(fechas_maestro, fechas_esclavo, ventana_busqueda=120, incluir_pares=False)
+
+        self.assertNotIn('pares', resumen)
+        self.assertNotIn('fechas_maestro', resumen)
+        self.assertEqual(resumen['varianza'], completo['varianza'])
+        self.assertEqual(resumen['desfases_validos'], completo['desfases_validos'])
+
+    def test_resumir_desfases_conserva_la_zona_horaria(self):
+        fechas_maestro = pd.to_datetime(['2020-01-01 08:00', '2020-03-01 08:00']).tz_localize('America/Mexico_City')
+        fechas_esclavo = fechas_maestro + pd.Timedelta(days=3)
+
+        resumen = resumir_desfases(fechas_maestro, fechas_esclavo, ventana_busqueda=30)
+
+        pd.testing.assert_index_equal(resumen['fechas_esclavo'], fechas_esclavo)
+        self.assertEqual(resumen['pares'][0], (fechas_maestro[0], fechas_esclavo[0], 3))
+        self.assertIn('pares_descartados', resumen.keys())
+
 
 class PeakMatchingAccessTests(unittest.TestCase):
     def test_resumen_seguro_retorna_metricas(self):
@@ -112,5 +284,14 @@ class PeakMatchingAccessTests(unittest.TestCase):
         self.assertEqual(resumen['varianza'], 0.0)
         self.assertEqual(resumen['pares_descartados'], [])
 
+    def test_no_recarga_si_el_modulo_no_cambio(self):
+        fechas = pd.to_datetime(['2022-01-01', '2022-02-01'])
+        resumir_desfases_seguro(fechas, fechas)
+
+        with mock.patch('importlib.reload', side_effect=AssertionError):
+            resumen = resumir_desfases_seguro(fechas, fechas)
+
+        self.assertEqual(resumen['desfases'], [0, 0])
+
 if __name__ == '__main__':
     unittest.main()
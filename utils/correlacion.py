@@ -0,0 +1,138 @@
+"""Correlación cruzada por desfase calculada con FFT para una o varias series a la vez."""
+
+from __future__ import annotations
+
+from typing import Tuple
+
+import numpy as np
+from scipy.fft import next_fast_len
+
+
+def _estandarizar(valores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Z-score por columna con los NaN convertidos en cero y su máscara de validez.
+
+    Estandarizar no altera Pearson y reduce la cancelación numérica de las sumas.
+    """
+    validos = ~np.isnan(valores)
+    conteos = np.maximum(validos.sum(axis=0), 1)
+    centrados = np.where(validos, valores - np.where(validos, valores, 0.0).sum(axis=0) / conteos, 0.0)
+    escalas = np.sqrt((centrados**2).sum(axis=0) / conteos)
+    return centrados / np.where(escalas > 0, escalas, 1.0), validos.astype(float)
+
+
+def _pearson_desde_sumas(conteo, suma_x, suma_xx, suma_y, suma_yy, suma_xy) -> np.ndarray:
+    """Pearson a partir de las sumas sobre el solape; NaN donde pandas también lo da."""
+    conteo = np.rint(conteo)
+    dispersion_x = conteo * suma_xx - suma_x**2
+    dispersion_y = conteo * suma_yy - suma_y**2
+    # Solapes sin variación (o con menos de dos puntos) no tienen correlación definida.
+    umbral = 1e-9 * conteo**2
+    definida = (conteo >= 2) & (dispersion_x > umbral) & (dispersion_y > umbral)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        correlacion = (conteo * suma_xy - suma_x * suma_y) / np.sqrt(dispersion_x * dispersion_y)
+    return np.where(definida, np.clip(correlacion, -1.0, 1.0), np.nan)
+
+
+def correlacion_cruzada(serie_a, serie_b, max_desfase: int) -> np.ndarray:
+    """Correlación de Pearson entre dos series para cada desfase en ``±max_desfase``.
+
+    La posición ``k`` equivale a ``serie_a.corr(serie_b.shift(k - max_desfase))`` con ambas
+    series alineadas por posición. ``scipy.signal.correlate`` elige entre suma directa y
+    FFT según la longitud, así que una llamada por suma sustituye el barrido por desfase.
+    """
+    from scipy.signal import correlate  # importación perezosa: scipy.signal tarda en cargar
+
+    valores = np.column_stack([np.asarray(serie_a, dtype=float), np.asarray(serie_b, dtype=float)])
+    total = valores.shape[0]
+    x, mascara = _estandarizar(valores)
+
+    def _cruzar(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        completa = correlate(a, b, mode="full")
+        # ``completa[total - 1 + k]`` es la suma de ``a[t] * b[t - k]``.
+        desplazada = np.zeros(2 * max_desfase + 1)
+        inicio = max(0, max_desfase - (total - 1))
+        bloque = completa[max(0, total - 1 - max_desfase) : total + max_desfase]
+        desplazada[inicio : inicio + bloque.size] = bloque
+        return desplazada
+
+    return _pearson_desde_sumas(
+        _cruzar(mascara[:, 0], mascara[:, 1]),
+        _cruzar(x[:, 0], mascara[:, 1]),
+        _cruzar(x[:, 0] ** 2, mascara[:, 1]),
+        _cruzar(mascara[:, 0], x[:, 1]),
+        _cruzar(mascara[:, 0], x[:, 1] ** 2),
+        _cruzar(x[:, 0], x[:, 1]),
+    )
+
+
+def correlacion_cruzada_matricial(valores: np.ndarray, max_desfase: int) -> np.ndarray:
+    """Correlación de Pearson entre todas las columnas para cada desfase en ``±max_desfase``.
+
+    ``valores`` es una matriz ``(T, n)`` que puede contener NaN. El resultado tiene forma
+    ``(n, n, 2 * max_desfase + 1)`` y la posición ``[i, j, k]`` equivale a
+    ``serie_i.corr(serie_j.shift(k - max_desfase))`` en pandas: cada desfase usa solo los
+    instantes en los que ambas series tienen dato.
+
+    En lugar de recorrer pares y desfases, se obtiene una sola FFT por columna de los
+    valores, sus cuadrados y su máscara de validez; los productos en frecuencia dan todas
+    las sumas necesarias (conteo, sumas y sumas de cuadrados sobre el solape) de una vez.
+    """
+    valores = np.asarray(valores, dtype=float)
+    total, columnas = valores.shape
+    desfases = np.arange(-max_desfase, max_desfase + 1)
+
+    x, mascara = _estandarizar(valores)
+
+    # Con ``T + max_desfase`` puntos ningún desfase de interés se solapa con otro al
+    # envolver la correlación circular.
+    longitud = next_fast_len(total + max_desfase, real=True)
+    f_mascara = np.fft.rfft(mascara, n=longitud, axis=0)
+    f_valores = np.fft.rfft(x, n=longitud, axis=0)
+    f_cuadrados = np.fft.rfft(x * x, n=longitud, axis=0)
+
+    # La correlación circular en el índice ``k`` (módulo ``longitud``) equivale a desfasar
+    # la segunda serie ``k`` posiciones, como ``shift(k)`` en pandas.
+    posiciones = desfases % longitud
+
+    def _cruzar(f_a: np.ndarray, f_b: np.ndarray) -> np.ndarray:
+        # Un bloque ``(F, n)`` por fila mantiene la memoria en O(T·n) en vez de O(T·n²).
+        producto = f_a[:, None] * np.conj(f_b)
+        return np.fft.irfft(producto, n=longitud, axis=0)[posiciones].T
+
+    resultado = np.empty((columnas, columnas, desfases.size))
+    for i in range(columnas):
+        resultado[i] = _pearson_desde_sumas(
+            _cruzar(f_mascara[:, i], f_mascara),
+            _cruzar(f_valores[:, i], f_mascara),
+            _cruzar(f_cuadrados[:, i], f_mascara),
+            _cruzar(f_mascara[:, i], f_valores),
+            _cruzar(f_mascara[:, i], f_cuadrados),
+            _cruzar(f_valores[:, i], f_valores),
+        )
+
+    return resultado
+
+
+def desfase_de_maxima_correlacion(correlaciones: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Desfase (en posiciones) y valor de la correlación máxima a lo largo del último eje.
+
+    El último eje debe cubrir ``-max_desfase..max_desfase`` como en
+    :func:`correlacion_cruzada_matricial`. Ante empates gana el desfase más negativo y,
+    si ninguna correlación supera ``-1``, se reporta desfase ``0`` con correlación ``-1``,
+    igual que el barrido secuencial ``if corr > max_corr`` que reemplaza.
+    """
+    correlaciones = np.asarray(correlaciones, dtype=float)
+    max_desfase = (correlaciones.shape[-1] - 1) // 2
+    candidatas = np.where(correlaciones > -1, correlaciones, -np.inf)
+    mejor = np.argmax(candidatas, axis=-1)
+    maximo = np.take_along_axis(candidatas, mejor[..., None], axis=-1)[..., 0]
+    hay_candidata = np.isfinite(maximo)
+    desfases = np.where(hay_candidata, mejor - max_desfase, 0)
+    return desfases, np.where(hay_candidata, maximo, -1.0)
+
+
+__all__ = [
+    "correlacion_cruzada",
+    "correlacion_cruzada_matricial",
+    "desfase_de_maxima_correlacion",
+]
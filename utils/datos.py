@@ -0,0 +1,28 @@
+"""Carga compartida de la base de datos de calidad del aire."""
+
+from __future__ import annotations
+
+import sqlite3
+
+import pandas as pd
+import streamlit as st
+
+_RUTA_BD = "contaminantes.db"
+
+
+@st.cache_data
+def cargar_datos() -> pd.DataFrame:
+    """Lee la tabla ``calidad_aire`` indexada y ordenada por ``Fecha``.
+
+    Todas las páginas comparten esta función, así que la tabla se consulta y se guarda
+    en caché una sola vez por proceso en lugar de una vez por página.
+    """
+
+    with sqlite3.connect(_RUTA_BD) as conn:
+        df = pd.read_sql_query(
+            "SELECT * FROM calidad_aire", conn, parse_dates=["Fecha"], index_col="Fecha"
+        )
+    return df.sort_index()
+
+
+__all__ = ["cargar_datos"]
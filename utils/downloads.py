@@ -2,47 +2,210 @@
 
 from __future__ import annotations
 
-import io
-from typing import Optional
+import importlib.util
+import json
+import logging
+import os
+import threading
+from functools import lru_cache, partial
+from typing import Callable, Optional, Tuple, TypeVar
 
 import streamlit as st
 
 from .runtime import runtime_activo
 
+# La disponibilidad de Kaleido no cambia durante el proceso: se consulta una sola vez.
+_KALEIDO_DISPONIBLE = importlib.util.find_spec("kaleido") is not None
+_FIGURA_PLOTLY = None
+# Clases de gráfico de Altair aceptadas; ``()`` si la versión instalada no expone ``TopLevelMixin``.
+_CLASES_ALTAIR: Optional[Tuple[type, ...]] = None
+# ``st.download_button`` acepta un callable como ``data`` (se evalúa al hacer clic) desde 1.52.
+_DATOS_DIFERIDOS = tuple(int(parte) for parte in st.__version__.split(".")[:2]) >= (1, 52)
+# Kaleido puede estar instalado sin Chrome: se sabe si exporta tras el primer intento.
+_PNG_FUNCIONA: Optional[bool] = None
+_SERVIDOR_KALEIDO_INICIADO = False
+# El servidor de Kaleido atiende una cola compartida: las sesiones exportan de una en una.
+_CANDADO_KALEIDO = threading.Lock()
+_LOGGER = logging.getLogger(__name__)
+_HTML_SIN_GRAFICA = "<p>No se pudo generar la gráfica para su descarga.</p>"
+_AVISO_PNG_FALLIDO = (
+    "No se pudo exportar la gráfica como imagen. Vuelve a la aplicación para descargar"
+    " la versión interactiva en HTML."
+).encode("utf-8")
+_T = TypeVar("_T")
+
 
 def _mostrar_advertencia(mensaje: str) -> None:
-    """Muestra una advertencia si el runtime está disponible."""
+    """Muestra una advertencia; solo se llama después de comprobar el runtime."""
+
+    st.warning(mensaje)
+
+
+def _diferir(
+    generar: Callable[[], _T],
+    respaldo: _T,
+    al_fallar: Optional[Callable[[], None]] = None,
+) -> Callable[[], _T]:
+    """Envuelve el contenido diferido de un ``st.download_button``.
+
+    El callable corre al hacer clic, fuera del script, donde una excepción solo produce un
+    error genérico de Streamlit. Aquí se registra en el log, se llama a ``al_fallar`` y se
+    entrega ``respaldo`` en su lugar.
+    """
+
+    def _generar_o_respaldo() -> _T:
+        try:
+            return generar()
+        except Exception:
+            _LOGGER.exception("No se pudo generar el contenido de una descarga diferida")
+            if al_fallar is not None:
+                al_fallar()
+            return respaldo
+
+    return _generar_o_respaldo
 
-    if runtime_activo():
-        st.warning(mensaje)
+
+def _desactivar_png_diferido() -> None:
+    """Tras un fallo al hacer clic, los siguientes reruns ofrecen la descarga en HTML."""
+
+    global _PNG_FUNCIONA
+    _PNG_FUNCIONA = False
+
+
+def _png_diferido(figura: "plotly.graph_objects.Figure", formato: str) -> Callable[[], bytes]:
+    """Exporta la imagen al hacer clic; si falla entrega un aviso en lugar de un archivo vacío."""
+
+    return _diferir(partial(_exportar_imagen, figura, formato), _AVISO_PNG_FALLIDO, _desactivar_png_diferido)
 
 
 def _kaleido_disponible() -> bool:
     """Detecta si Kaleido está instalado para exportar imágenes de Plotly."""
 
-    try:  # pragma: no cover - la disponibilidad depende del entorno de ejecución
-        import kaleido  # type: ignore  # noqa: F401
+    return _KALEIDO_DISPONIBLE
+
+
+def _clase_figura_plotly() -> type:
+    """Importa ``plotly.graph_objects.Figure`` la primera vez y la reutiliza después."""
 
-        return True
+    global _FIGURA_PLOTLY
+    if _FIGURA_PLOTLY is None:
+        from plotly.graph_objects import Figure  # importación perezosa
+
+        _FIGURA_PLOTLY = Figure
+    return _FIGURA_PLOTLY
+
+
+def _clases_grafico_altair() -> Tuple[type, ...]:
+    """Importa Altair la primera vez y reutiliza las clases de gráfico después."""
+
+    global _CLASES_ALTAIR
+    if _CLASES_ALTAIR is None:
+        import altair as alt  # importación perezosa
+
+        mixin = getattr(alt, "TopLevelMixin", None)
+        _CLASES_ALTAIR = (mixin,) if mixin is not None else ()
+    return _CLASES_ALTAIR
+
+
+def _iniciar_servidor_kaleido() -> None:
+    """Deja un navegador de Kaleido abierto para que las exportaciones no lancen uno cada vez.
+
+    Kaleido 1.x arranca y cierra Chrome en cada ``to_image`` salvo que exista su servidor
+    síncrono; las versiones 0.x ya mantienen su propio proceso y no exponen esta función.
+    Solo se llama tras una exportación exitosa: si Chrome no arranca, el servidor deja
+    las llamadas esperando indefinidamente.
+    """
+
+    global _SERVIDOR_KALEIDO_INICIADO
+    if _SERVIDOR_KALEIDO_INICIADO:
+        return
+    _SERVIDOR_KALEIDO_INICIADO = True
+    try:  # pragma: no cover - depende de Kaleido y Chrome instalados
+        import kaleido  # type: ignore  # importación perezosa
+
+        iniciar = getattr(kaleido, "start_sync_server", None)
+        if iniciar is not None:
+            iniciar(silence_warnings=True)
     except Exception:
-        return False
+        pass  # Sin servidor persistente cada exportación abre su propio navegador.
 
 
 def _descarga_plotly_como_png(
     figura: "plotly.graph_objects.Figure",
     *,
     formato: str,
-) -> Optional[io.BytesIO]:
-    """Intenta exportar la figura como imagen y regresa el buffer listo para descargar."""
+) -> Optional[bytes]:
+    """Intenta exportar la figura como imagen y regresa los bytes listos para descargar.
+
+    ``st.download_button`` acepta los bytes en caché tal cual: envolverlos en un
+    ``BytesIO`` solo añadía una copia por rerun.
+    """
 
-    buffer = io.BytesIO()
+    global _PNG_FUNCIONA
     try:  # pragma: no cover - depende de Kaleido instalado
-        figura.write_image(buffer, format=formato)
+        imagen = _exportar_imagen(figura, formato)
     except Exception:
+        _PNG_FUNCIONA = False
+        return None
+
+    _PNG_FUNCIONA = True
+    _iniciar_servidor_kaleido()
+    return imagen
+
+
+@lru_cache(maxsize=32)
+def _imagen_en_cache(figura_json: str, formato: str) -> bytes:
+    """Exporta la figura serializada; una figura sin cambios reutiliza los bytes ya generados.
+
+    Se usa ``lru_cache`` y no ``st.cache_data`` porque la exportación diferida corre al
+    hacer clic, fuera del contexto del script.
+    """
+
+    import plotly.io as pio  # importación perezosa
+
+    # El JSON sale de un ``Figure`` válido: no hace falta volver a validar el esquema.
+    with _CANDADO_KALEIDO:
+        return pio.to_image(json.loads(figura_json), format=formato, validate=False)
+
+
+def _exportar_imagen(figura: "plotly.graph_objects.Figure", formato: str) -> bytes:
+    """Genera la imagen con Kaleido reutilizando su navegador entre exportaciones."""
+
+    return _imagen_en_cache(figura.to_json(), formato)
+
+
+@lru_cache(maxsize=1)
+def _envoltura_html_plotly() -> Optional[Tuple[str, str]]:
+    """Obtiene una sola vez el inicio del documento y las etiquetas que cargan Plotly.js.
+
+    Con ``include_plotlyjs="cdn"`` Plotly calcula el hash SRI de todo su bundle de
+    JavaScript (varios MB) en cada ``to_html``. Se compara una figura trivial exportada
+    con y sin CDN para extraer esas etiquetas y reutilizarlas en todas las descargas.
+    """
+
+    from plotly.graph_objects import Figure  # importación perezosa
+
+    figura = Figure()
+    con_cdn = figura.to_html(include_plotlyjs="cdn", div_id="sincronia")
+    sin_cdn = figura.to_html(include_plotlyjs=False, div_id="sincronia")
+    comun = len(os.path.commonprefix([con_cdn, sin_cdn]))
+    etiquetas = con_cdn[comun : comun + len(con_cdn) - len(sin_cdn)]
+    # Solo es válido si la versión con CDN es exactamente la otra con las etiquetas insertadas.
+    if con_cdn != sin_cdn[:comun] + etiquetas + sin_cdn[comun:]:
         return None
+    return sin_cdn[:comun], etiquetas
+
 
-    buffer.seek(0)
-    return buffer
+def _html_interactivo(figura: "plotly.graph_objects.Figure") -> str:
+    """Equivale a ``figura.to_html(include_plotlyjs="cdn")`` sin recalcular el hash del bundle."""
+
+    envoltura = _envoltura_html_plotly()
+    if envoltura is not None:
+        inicio, etiquetas = envoltura
+        documento = figura.to_html(include_plotlyjs=False)
+        if documento.startswith(inicio):
+            return inicio + etiquetas + documento[len(inicio) :]
+    return figura.to_html(include_plotlyjs="cdn")
 
 
 def boton_descarga_plotly(
@@ -56,6 +219,8 @@ def boton_descarga_plotly(
     """Renderiza un botón de descarga para gráficas de Plotly.
 
     * Si Kaleido está disponible, genera una imagen en el formato indicado.
+      Una vez que una exportación funcionó en el proceso, la imagen se genera
+      solo cuando el usuario hace clic en lugar de en cada rerun.
     * En entornos sin Kaleido, ofrece un HTML interactivo para que la descarga
       nunca falle ni oculte la visualización original.
     """
@@ -64,7 +229,7 @@ def boton_descarga_plotly(
         return
 
     try:
-        from plotly.graph_objects import Figure  # importación perezosa
+        Figure = _clase_figura_plotly()
     except ImportError:
         _mostrar_advertencia(
             "Plotly no está disponible para exportar la gráfica. Instala 'plotly' y 'kaleido' para habilitar esta función."
@@ -77,27 +242,33 @@ def boton_descarga_plotly(
         )
         return
 
-    buffer = None
-    if _kaleido_disponible():
-        buffer = _descarga_plotly_como_png(figura, formato=formato)
+    datos = None
+    if _kaleido_disponible() and _PNG_FUNCIONA is not False:
+        if _PNG_FUNCIONA and _DATOS_DIFERIDOS:
+            datos = _png_diferido(figura, formato)
+        else:
+            datos = _descarga_plotly_como_png(figura, formato=formato)
 
-    if buffer is not None:
+    if datos is not None:
         st.download_button(
             label=etiqueta,
-            data=buffer,
+            data=datos,
             file_name=nombre_archivo,
             mime=f"image/{formato}",
         )
         return
 
     # Fallback: generar un HTML interactivo para no bloquear la descarga.
-    try:
-        contenido_html = figura.to_html(include_plotlyjs="cdn")
-    except Exception:  # pragma: no cover - depende de la configuración del gráfico
-        _mostrar_advertencia(
-            "No se pudo preparar la gráfica para descarga."
-        )
-        return
+    if _DATOS_DIFERIDOS:
+        contenido_html = _diferir(partial(_html_interactivo, figura), _HTML_SIN_GRAFICA)
+    else:
+        try:
+            contenido_html = _html_interactivo(figura)
+        except Exception:  # pragma: no cover - depende de la configuración del gráfico
+            _mostrar_advertencia(
+                "No se pudo preparar la gráfica para descarga."
+            )
+            return
 
     nombre_html = nombre_archivo.rsplit(".", 1)[0] + ".html"
     st.download_button(
@@ -123,18 +294,12 @@ def boton_descarga_altair(
         return
 
     try:
-        import altair as alt  # importación perezosa
+        clases_altair = _clases_grafico_altair()
     except ImportError:
         _mostrar_advertencia("Altair no está disponible para exportar la gráfica.")
         return
 
-    grafico_valido = False
-
-    if hasattr(alt, "TopLevelMixin"):
-        grafico_valido = isinstance(grafica, alt.TopLevelMixin)
-
-    if not grafico_valido and hasattr(grafica, "to_html"):
-        grafico_valido = True
+    grafico_valido = isinstance(grafica, clases_altair) or hasattr(grafica, "to_html")
 
     if not grafico_valido:
         _mostrar_advertencia(
@@ -142,11 +307,16 @@ def boton_descarga_altair(
         )
         return
 
-    try:
-        contenido_html = grafica.to_html()
-    except Exception:  # pragma: no cover - depende de la configuración del gráfico
-        _mostrar_advertencia("No se pudo generar el archivo HTML de la gráfica para su descarga.")
-        return
+    if _DATOS_DIFERIDOS:
+        # ``to_html`` valida y serializa todo el spec (decenas de ms con los datos
+        # embebidos): solo se genera cuando el usuario hace clic.
+        contenido_html = _diferir(grafica.to_html, _HTML_SIN_GRAFICA)
+    else:
+        try:
+            contenido_html = grafica.to_html()
+        except Exception:  # pragma: no cover - depende de la configuración del gráfico
+            _mostrar_advertencia("No se pudo generar el archivo HTML de la gráfica para su descarga.")
+            return
 
     st.download_button(
         label=etiqueta,
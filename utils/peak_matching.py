@@ -1,13 +1,156 @@
-from bisect import bisect_left
-from typing import Iterable, List, Optional, Tuple, Union
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import pandas as pd
 
 
-def _ordenar_fechas(fechas: Iterable[pd.Timestamp]) -> List[pd.Timestamp]:
-    """Devuelve una lista ordenada de fechas como objetos Timestamp."""
-    return sorted(pd.to_datetime(list(fechas)))
+_NS_POR_DIA = 86_400_000_000_000
+
+
+_NS_POR_UNIDAD = {"s": 1_000_000_000, "ms": 1_000_000, "us": 1_000, "ns": 1}
+
+
+def _ordenar_fechas(
+    fechas: Iterable[pd.Timestamp],
+) -> Tuple[np.ndarray, np.ndarray, pd.DatetimeIndex]:
+    """Ordena las fechas como enteros (nanosegundos desde la época) con ``np.argsort``.
+
+    Devuelve los instantes ordenados, la permutación aplicada y el ``DatetimeIndex`` de
+    origen; los objetos Timestamp solo se crean para armar los pares que se reportan.
+    """
+    if isinstance(fechas, (np.ndarray, pd.Series)) and fechas.dtype.kind == "M":
+        # Ya son ``datetime64``: envolverlas evita que ``to_datetime`` las recorra de nuevo.
+        fechas = pd.DatetimeIndex(fechas)
+    elif not isinstance(fechas, pd.DatetimeIndex):
+        if not hasattr(fechas, "__len__"):
+            fechas = list(fechas)
+        fechas = pd.DatetimeIndex(pd.to_datetime(fechas))
+    instantes = fechas.asi8 * _NS_POR_UNIDAD[fechas.unit]
+    orden = np.argsort(instantes, kind="stable")
+    return instantes[orden], orden, fechas
+
+
+def _buscar_libre(saltos: List[int], indice: int) -> int:
+    """Sigue los saltos hasta la primera posición libre, acortando el camino recorrido."""
+    while saltos[indice] != indice:
+        saltos[indice] = saltos[saltos[indice]]
+        indice = saltos[indice]
+    return indice
+
+
+def _mas_cercano(ns_origen: np.ndarray, ns_destino: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Índice del destino más cercano a cada origen y su desfase en días (destino - origen).
+
+    Ambos arreglos deben estar ordenados. Es la misma búsqueda que
+    ``DatetimeIndex.get_indexer(..., method="nearest")`` pero sobre enteros y sin el costo
+    de pandas por llamada. Además, ante empates gana el destino anterior (pandas elige el
+    posterior), el mismo criterio que ``(abs(desfase), desfase)`` del recorrido voraz.
+    """
+    total_destino = ns_destino.size
+    posiciones = np.searchsorted(ns_destino, ns_origen, side="left")
+    siguiente = np.minimum(posiciones, total_destino - 1)
+    previo = np.maximum(posiciones - 1, 0)
+
+    dias_siguiente = (ns_destino[siguiente] - ns_origen) // _NS_POR_DIA
+    dias_previo = (ns_destino[previo] - ns_origen) // _NS_POR_DIA
+    usar_previo = (posiciones > 0) & (
+        (posiciones == total_destino) | (np.abs(dias_previo) <= np.abs(dias_siguiente))
+    )
+    return np.where(usar_previo, previo, siguiente), np.where(usar_previo, dias_previo, dias_siguiente)
+
+
+def _emparejar_mas_cercanos(
+    ns_maestro: np.ndarray, ns_esclavo: np.ndarray, ventana_maxima_dias: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """Empareja cada maestro con su esclavo más cercano en una pasada vectorizada.
+
+    Devuelve índices de maestro, índices de esclavo y desfases en días de las coincidencias
+    dentro de la ventana, junto con cuántos maestros (en orden) quedan resueltos. El
+    resultado es idéntico al del recorrido voraz hasta el primer maestro que reclama un
+    esclavo ya tomado; desde ahí el orden de consumo importa y hay que seguir con el recorrido.
+    """
+    indices_esclavo, desfases = _mas_cercano(ns_maestro, ns_esclavo)
+
+    dentro = np.abs(desfases) <= ventana_maxima_dias
+    indices_maestro = np.flatnonzero(dentro)
+    indices_esclavo = indices_esclavo[dentro]
+    desfases = desfases[dentro]
+
+    # Con los maestros ordenados, su esclavo más cercano no decrece: basta mirar vecinos.
+    conflictos = np.flatnonzero(indices_esclavo[1:] == indices_esclavo[:-1])
+    if conflictos.size == 0:
+        return indices_maestro, indices_esclavo, desfases, ns_maestro.size
+    corte = int(conflictos[0]) + 1
+    return indices_maestro[:corte], indices_esclavo[:corte], desfases[:corte], int(indices_maestro[corte])
+
+
+def _emparejar_mutuos(
+    ns_maestro: np.ndarray, ns_esclavo: np.ndarray, ventana_maxima_dias: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Empareja solo los picos que son mutuamente el más cercano del otro.
+
+    Un maestro y un esclavo forman pareja cuando cada uno es el vecino más cercano del
+    otro, así que el resultado no depende del orden en que se recorren los maestros.
+    """
+    esclavo_de_maestro, desfases = _mas_cercano(ns_maestro, ns_esclavo)
+    maestro_de_esclavo, _ = _mas_cercano(ns_esclavo, ns_maestro)
+    indices_maestro = np.arange(ns_maestro.size)
+    mutuos = (maestro_de_esclavo[esclavo_de_maestro] == indices_maestro) & (
+        np.abs(desfases) <= ventana_maxima_dias
+    )
+    return indices_maestro[mutuos], esclavo_de_maestro[mutuos], desfases[mutuos]
+
+
+def _fechas_emparejadas(
+    lado: Tuple[np.ndarray, np.ndarray, pd.DatetimeIndex], indices: Sequence[int]
+) -> pd.DatetimeIndex:
+    """Fechas de origen de las posiciones ordenadas indicadas, con su zona horaria y unidad."""
+    _, orden, fechas = lado
+    return fechas.take(orden[np.asarray(indices, dtype=np.intp)])
+
+
+def _armar_pares(
+    maestro: Tuple[np.ndarray, np.ndarray, pd.DatetimeIndex],
+    esclavo: Tuple[np.ndarray, np.ndarray, pd.DatetimeIndex],
+    indices_maestro,
+    indices_esclavo,
+    desfases: List[int],
+) -> List[Tuple[pd.Timestamp, pd.Timestamp, int]]:
+    """Arma los pares ``(maestro, esclavo, desfase)`` a partir de posiciones ya ordenadas."""
+    # ``tolist`` convierte las fechas elegidas en Timestamps de una vez, mucho más barato
+    # que indexar el ``DatetimeIndex`` elemento por elemento.
+    return list(
+        zip(
+            _fechas_emparejadas(maestro, indices_maestro).tolist(),
+            _fechas_emparejadas(esclavo, indices_esclavo).tolist(),
+            desfases,
+        )
+    )
+
+
+def _metricas_desfases(desfases: List[int]) -> Tuple[float, float, float]:
+    """Varianza, media y desviación estándar poblacionales en una sola pasada.
+
+    Con la suma y la suma de cuadrados (un ``dot``) basta para las tres métricas, en
+    lugar de recorrer el arreglo por separado en ``np.var``, ``np.mean`` y ``np.std``.
+    """
+    n = len(desfases)
+    if n == 0:
+        return np.nan, np.nan, np.nan
+    # Con uno o dos desfases (frecuente en series con pocos picos) la aritmética de Python
+    # es más rápida que crear el arreglo.
+    if n == 1:
+        return 0.0, float(desfases[0]), 0.0
+    if n == 2:
+        a, b = float(desfases[0]), float(desfases[1])
+        media = (a + b) / 2
+        varianza = (a - media) ** 2
+        return varianza, media, abs(a - media)
+    arr = np.fromiter(desfases, dtype=np.float64, count=n)
+    media = float(arr.sum()) / n
+    varianza = max(float(np.dot(arr, arr)) / n - media * media, 0.0)
+    return varianza, media, math.sqrt(varianza)
 
 
 def calcular_desfases_entre_picos(
@@ -16,60 +159,97 @@ def calcular_desfases_entre_picos(
     ventana_maxima_dias: int = 90,
     *,
     return_pares: bool = False,
+    mutuo: bool = False,
 ) -> Union[List[int], Tuple[List[int], List[Tuple[pd.Timestamp, pd.Timestamp, int]]]]:
     """Calcula los desfases (en días) entre los picos maestro y esclavo.
 
     Alinea cada pico maestro con el pico esclavo temporalmente más cercano
     sin reutilizar coincidencias previas. Solo se consideran coincidencias
-    dentro de la ``ventana_maxima_dias`` indicada.
+    dentro de la ``ventana_maxima_dias`` indicada. Con ``mutuo=True`` solo se
+    conservan los pares que son mutuamente el vecino más cercano, en lugar de
+    dejar que el primer maestro se quede con un esclavo disputado.
     """
     if ventana_maxima_dias < 0:
         raise ValueError("ventana_maxima_dias debe ser no negativa")
 
-    fechas_maestro_lista = list(fechas_maestro)
-    fechas_esclavo_lista = list(fechas_esclavo)
+    maestro = _ordenar_fechas(fechas_maestro)
+    esclavo = _ordenar_fechas(fechas_esclavo)
+    indices_maestro, indices_esclavo, desfases = _emparejar(
+        maestro[0], esclavo[0], ventana_maxima_dias, mutuo
+    )
+    if return_pares:
+        return desfases, _armar_pares(maestro, esclavo, indices_maestro, indices_esclavo, desfases)
+    return desfases
 
-    if len(fechas_maestro_lista) == 0 or len(fechas_esclavo_lista) == 0:
-        return ([], []) if return_pares else []
 
-    fechas_maestro_ordenadas = _ordenar_fechas(fechas_maestro_lista)
-    fechas_esclavo_restantes = _ordenar_fechas(fechas_esclavo_lista)
+def _emparejar(
+    ns_maestro: np.ndarray, ns_esclavo: np.ndarray, ventana_maxima_dias: int, mutuo: bool = False
+) -> Tuple[Sequence[int], Sequence[int], List[int]]:
+    """Posiciones ordenadas de maestro y esclavo emparejadas y su desfase en días."""
+    # Restar enteros y dividir entre el día equivale a ``Timedelta.days`` sin crear objetos.
+    if ns_maestro.size == 0 or ns_esclavo.size == 0:
+        return [], [], []
 
-    desfases: List[int] = []
-    pares: List[Tuple[pd.Timestamp, pd.Timestamp, int]] = []
+    if mutuo:
+        indices_maestro, indices_esclavo, desfases_dias = _emparejar_mutuos(
+            ns_maestro, ns_esclavo, ventana_maxima_dias
+        )
+        return indices_maestro, indices_esclavo, desfases_dias.tolist()
+
+    indices_maestro, indices_esclavo, desfases_dias, resueltos = _emparejar_mas_cercanos(
+        ns_maestro, ns_esclavo, ventana_maxima_dias
+    )
+    desfases: List[int] = desfases_dias.tolist()
 
-    for fecha_maestro in fechas_maestro_ordenadas:
-        if not fechas_esclavo_restantes:
+    # A partir del primer conflicto se sigue con el recorrido voraz sobre los esclavos libres.
+    if resueltos == ns_maestro.size:
+        return indices_maestro, indices_esclavo, desfases
+
+    posiciones = np.searchsorted(ns_esclavo, ns_maestro, side="left").tolist()
+    ns_maestro = ns_maestro.tolist()
+    ns_esclavo = ns_esclavo.tolist()
+    total_esclavo = len(ns_esclavo)
+    # Saltos tipo unión-búsqueda sobre los esclavos ya emparejados: cada posición apunta a sí
+    # misma si está libre o hacia el siguiente libre (a la derecha o a la izquierda). Así
+    # encontrar vecinos libres no recorre rachas largas de esclavos usados.
+    saltos_derecha = list(range(total_esclavo + 1))  # ``total_esclavo``: no hay más a la derecha
+    saltos_izquierda = list(range(total_esclavo + 1))  # desplazados en 1; ``0``: no hay a la izquierda
+    for usado in indices_esclavo.tolist():
+        saltos_derecha[usado] = usado + 1
+        saltos_izquierda[usado + 1] = usado
+    disponibles = total_esclavo - indices_esclavo.size
+    indices_maestro = indices_maestro.tolist()
+    indices_esclavo = indices_esclavo.tolist()
+
+    for indice_maestro in range(resueltos, len(ns_maestro)):
+        instante_maestro = ns_maestro[indice_maestro]
+        if not disponibles:
             break
 
-        posicion = bisect_left(fechas_esclavo_restantes, fecha_maestro)
+        posicion = posiciones[indice_maestro]
+        siguiente = _buscar_libre(saltos_derecha, posicion)
+        previo = _buscar_libre(saltos_izquierda, posicion) - 1
+
         candidatos = []
-        if posicion < len(fechas_esclavo_restantes):
-            candidatos.append((posicion, fechas_esclavo_restantes[posicion]))
-        if posicion > 0:
-            indice_previo = posicion - 1
-            candidatos.append((indice_previo, fechas_esclavo_restantes[indice_previo]))
+        if siguiente < total_esclavo:
+            candidatos.append((siguiente, (ns_esclavo[siguiente] - instante_maestro) // _NS_POR_DIA))
+        if previo >= 0:
+            candidatos.append((previo, (ns_esclavo[previo] - instante_maestro) // _NS_POR_DIA))
 
         if not candidatos:
             continue
 
-        indice_seleccionado, fecha_candidata = min(
-            candidatos,
-            key=lambda item: (
-                abs((item[1] - fecha_maestro).days),
-                (item[1] - fecha_maestro).days,
-            ),
-        )
+        indice_seleccionado, desfase_dias = min(candidatos, key=lambda item: (abs(item[1]), item[1]))
 
-        desfase_dias = (fecha_candidata - fecha_maestro).days
         if abs(desfase_dias) <= ventana_maxima_dias:
             desfases.append(desfase_dias)
-            pares.append((fecha_maestro, fecha_candidata, desfase_dias))
-            del fechas_esclavo_restantes[indice_seleccionado]
+            indices_maestro.append(indice_maestro)
+            indices_esclavo.append(indice_seleccionado)
+            saltos_derecha[indice_seleccionado] = indice_seleccionado + 1
+            saltos_izquierda[indice_seleccionado + 1] = indice_seleccionado
+            disponibles -= 1
 
-    if return_pares:
-        return desfases, pares
-    return desfases
+    return indices_maestro, indices_esclavo, desfases
 
 
 def resumir_desfases(
@@ -78,7 +258,9 @@ def resumir_desfases(
     *,
     ventana_busqueda: int = 90,
     ventana_confiable: Optional[int] = 45,
-) -> dict:
+    incluir_pares: bool = True,
+    mutuo: bool = False,
+) -> Dict[str, object]:
     """Calcula métricas de desfase entre dos conjuntos de picos.
 
     Devuelve la lista completa de emparejamientos encontrados dentro de la
@@ -86,6 +268,12 @@ def resumir_desfases(
     ``ventana_confiable``. Las métricas (varianza, desfase medio y desviación
     estándar) se calculan únicamente con los emparejamientos confiables para
     evitar que coincidencias muy lejanas distorsionen el resultado.
+
+    ``desfases_dias`` y ``mascara_confiable`` guardan los emparejamientos por columnas.
+    Con ``incluir_pares=False`` el resultado omite las fechas emparejadas (``pares``,
+    ``pares_validos``, ``pares_descartados``, ``fechas_maestro`` y ``fechas_esclavo``):
+    quien solo lee las métricas no crea ningún Timestamp. ``mutuo`` se pasa al
+    emparejamiento igual que en :func:`calcular_desfases_entre_picos`.
     """
 
     ventana_busqueda = max(0, int(ventana_busqueda))
@@ -93,53 +281,47 @@ def resumir_desfases(
         ventana_confiable = max(0, int(ventana_confiable))
         ventana_confiable = min(ventana_confiable, ventana_busqueda)
 
-    desfases, pares = calcular_desfases_entre_picos(
-        fechas_maestro,
-        fechas_esclavo,
-        ventana_maxima_dias=ventana_busqueda,
-        return_pares=True,
-    )
+    maestro = _ordenar_fechas(fechas_maestro)
+    esclavo = _ordenar_fechas(fechas_esclavo)
+    indices_maestro, indices_esclavo, desfases = _emparejar(maestro[0], esclavo[0], ventana_busqueda, mutuo)
 
+    desfases_dias = np.array(desfases, dtype=np.int64)
     if ventana_confiable is None:
-        pares_validos = pares
-        pares_descartados: List[Tuple[pd.Timestamp, pd.Timestamp, int]] = []
-    else:
-        pares_validos = [
-            (maestro, esclavo, desfase)
-            for maestro, esclavo, desfase in pares
-            if abs(desfase) <= ventana_confiable
-        ]
-        pares_descartados = [
-            (maestro, esclavo, desfase)
-            for maestro, esclavo, desfase in pares
-            if abs(desfase) > ventana_confiable
-        ]
-
-    desfases_validos = [desfase for _, _, desfase in pares_validos]
-    arr = np.array(desfases_validos, dtype=float)
-
-    if arr.size == 0:
-        varianza = np.nan
-        desfase_medio = np.nan
-        desviacion = np.nan
-    elif arr.size == 1:
-        varianza = 0.0
-        desfase_medio = float(arr[0])
-        desviacion = 0.0
+        mascara_confiable = np.ones(desfases_dias.size, dtype=bool)
+        desfases_validos = list(desfases)
     else:
-        varianza = float(np.var(arr))
-        desfase_medio = float(np.mean(arr))
-        desviacion = float(np.std(arr))
+        mascara_confiable = np.abs(desfases_dias) <= ventana_confiable
+        desfases_validos = desfases_dias[mascara_confiable].tolist()
+
+    varianza, desfase_medio, desviacion = _metricas_desfases(desfases_validos)
 
-    return {
+    resumen: Dict[str, object] = {
         "desfases": desfases,
-        "pares": pares,
         "desfases_validos": desfases_validos,
-        "pares_validos": pares_validos,
-        "pares_descartados": pares_descartados,
+        "desfases_dias": desfases_dias,
+        "mascara_confiable": mascara_confiable,
         "varianza": varianza,
         "desfase_medio": desfase_medio,
         "desviacion_estandar": desviacion,
         "ventana_busqueda": ventana_busqueda,
         "ventana_confiable": ventana_confiable,
     }
+    if not incluir_pares:
+        return resumen
+
+    fechas_emparejadas_maestro = _fechas_emparejadas(maestro, indices_maestro)
+    fechas_emparejadas_esclavo = _fechas_emparejadas(esclavo, indices_esclavo)
+    pares = list(zip(fechas_emparejadas_maestro.tolist(), fechas_emparejadas_esclavo.tolist(), desfases))
+    pares_validos = []
+    pares_descartados = []
+    for par, confiable in zip(pares, mascara_confiable.tolist()):
+        (pares_validos if confiable else pares_descartados).append(par)
+
+    resumen.update(
+        pares=pares,
+        pares_validos=pares_validos,
+        pares_descartados=pares_descartados,
+        fechas_maestro=fechas_emparejadas_maestro,
+        fechas_esclavo=fechas_emparejadas_esclavo,
+    )
+    return resumen
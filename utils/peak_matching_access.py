@@ -2,25 +2,53 @@
 from __future__ import annotations
 
 import importlib
-from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import math
+import os
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
 
-import numpy as np
-import pandas as pd
+if TYPE_CHECKING:
+    import pandas as pd
 
-import utils.peak_matching as _peak_matching
 
+_Pareja = Tuple["pd.Timestamp", "pd.Timestamp", int]
 
-_Pareja = Tuple[pd.Timestamp, pd.Timestamp, int]
+# ``utils.peak_matching`` (y con él numpy y pandas) se importa hasta la primera consulta.
+_peak_matching = None
+
+
+def _fecha_modificacion() -> Optional[float]:
+    try:
+        return os.path.getmtime(_peak_matching.__file__)
+    except (OSError, TypeError):
+        return None
+
+
+# Solo se recarga ``utils.peak_matching`` cuando su archivo cambió desde la última vez.
+_ULTIMO_MTIME: Optional[float] = None
+_FUNCION_EN_CACHE: Optional[Callable[..., Dict[str, object]]] = None
 
 
 def _calcular_metricas(desfases: Iterable[int]) -> Tuple[float, float, float]:
-    arr = np.array(list(desfases), dtype=float)
-    if arr.size == 0:
+    if not isinstance(desfases, (list, tuple)):
+        desfases = list(desfases)
+    conteo = len(desfases)
+    if conteo == 0:
         return float("nan"), float("nan"), float("nan")
-    if arr.size == 1:
-        valor = float(arr[0])
+    if conteo == 1:
+        valor = float(desfases[0])
         return 0.0, valor, 0.0
-    return float(np.var(arr)), float(np.mean(arr)), float(np.std(arr))
+    if conteo == 2:
+        # Con dos valores la aritmética de Python evita crear el arreglo.
+        a, b = float(desfases[0]), float(desfases[1])
+        media = (a + b) / 2
+        return (a - media) ** 2, media, abs(a - media)
+    import numpy as np  # importación perezosa
+
+    arr = np.fromiter(desfases, dtype=np.float64, count=conteo)
+    # Media y varianza desde la suma y la suma de cuadrados: dos reducciones en vez de tres.
+    media = float(arr.sum()) / arr.size
+    varianza = max(float(np.dot(arr, arr)) / arr.size - media * media, 0.0)
+    return varianza, media, math.sqrt(varianza)
 
 
 def _resumir_desfases_fallback(
@@ -30,6 +58,8 @@ def _resumir_desfases_fallback(
     *,
     ventana_busqueda: int = 90,
     ventana_confiable: Optional[int] = 45,
+    incluir_pares: bool = True,
+    mutuo: bool = False,
 ) -> Dict[str, object]:
     ventana_busqueda = max(0, int(ventana_busqueda))
     if ventana_confiable is not None:
@@ -37,65 +67,86 @@ def _resumir_desfases_fallback(
         ventana_confiable = min(ventana_confiable, ventana_busqueda)
 
     pares: List[_Pareja] = []
-    desfases: List[int] = []
-    try:
-        resultado = calcular_desfases(
-            fechas_maestro,
-            fechas_esclavo,
-            ventana_maxima_dias=ventana_busqueda,
-            return_pares=True,
-        )
-    except TypeError:
-        desfases = list(
-            calcular_desfases(
+    resultado = None
+    # Solo se pasa ``mutuo`` cuando se pide, para seguir aceptando versiones que no lo conocen.
+    opciones = {"mutuo": True} if mutuo else {}
+    if incluir_pares:
+        try:
+            resultado = calcular_desfases(
                 fechas_maestro,
                 fechas_esclavo,
                 ventana_maxima_dias=ventana_busqueda,
+                return_pares=True,
+                **opciones,
             )
+        except TypeError:
+            pass  # Versión sin ``return_pares``: solo se obtienen los desfases.
+    if resultado is None:
+        resultado = calcular_desfases(
+            fechas_maestro,
+            fechas_esclavo,
+            ventana_maxima_dias=ventana_busqueda,
+            **opciones,
         )
+    if isinstance(resultado, tuple) and len(resultado) == 2:
+        desfases, pares = resultado
     else:
-        if isinstance(resultado, tuple) and len(resultado) == 2:
-            desfases, pares = resultado
-        else:
-            desfases = list(resultado)
-
-    if ventana_confiable is None or not pares:
-        pares_validos = pares
-        pares_descartados: List[_Pareja] = []
-        desfases_validos = list(desfases)
-    else:
-        pares_validos = [
-            (maestro, esclavo, desfase)
-            for maestro, esclavo, desfase in pares
-            if abs(desfase) <= ventana_confiable
-        ]
-        pares_descartados = [
-            (maestro, esclavo, desfase)
-            for maestro, esclavo, desfase in pares
-            if abs(desfase) > ventana_confiable
-        ]
-        desfases_validos = [desfase for _, _, desfase in pares_validos]
+        desfases = list(resultado)
 
+    # La misma máscara reparte desfases y pares (si los hay) entre válidos y descartados.
+    confiables = [ventana_confiable is None or abs(desfase) <= ventana_confiable for desfase in desfases]
+    desfases_validos = [desfase for desfase, confiable in zip(desfases, confiables) if confiable]
     varianza, desfase_medio, desviacion = _calcular_metricas(desfases_validos)
+    import numpy as np  # importación perezosa
 
-    return {
+    resumen: Dict[str, object] = {
         "desfases": list(desfases),
-        "pares": pares,
         "desfases_validos": desfases_validos,
-        "pares_validos": pares_validos,
-        "pares_descartados": pares_descartados,
+        "desfases_dias": np.array(desfases, dtype=np.int64),
+        "mascara_confiable": np.array(confiables, dtype=bool),
         "varianza": varianza,
         "desfase_medio": desfase_medio,
         "desviacion_estandar": desviacion,
         "ventana_busqueda": ventana_busqueda,
         "ventana_confiable": ventana_confiable,
     }
+    if not incluir_pares:
+        return resumen
+
+    import pandas as pd  # importación perezosa
+
+    resumen.update(
+        pares=pares,
+        pares_validos=[par for par, confiable in zip(pares, confiables) if confiable],
+        pares_descartados=[par for par, confiable in zip(pares, confiables) if not confiable],
+        fechas_maestro=pd.DatetimeIndex([par[0] for par in pares]),
+        fechas_esclavo=pd.DatetimeIndex([par[1] for par in pares]),
+    )
+    return resumen
 
 
 def obtener_resumir_desfases() -> Callable[..., Dict[str, object]]:
-    """Recupera ``resumir_desfases`` asegurando recarga del módulo base."""
+    """Recupera ``resumir_desfases`` recargando el módulo base solo si se modificó."""
+
+    global _peak_matching, _ULTIMO_MTIME, _FUNCION_EN_CACHE
+
+    if _peak_matching is None:
+        _peak_matching = importlib.import_module("utils.peak_matching")
+        _ULTIMO_MTIME = _fecha_modificacion()
+
+    mtime = _fecha_modificacion()
+    if mtime == _ULTIMO_MTIME and _FUNCION_EN_CACHE is not None:
+        return _FUNCION_EN_CACHE
+
+    modulo = _peak_matching
+    if mtime != _ULTIMO_MTIME:
+        modulo = _peak_matching = importlib.reload(_peak_matching)
+    _ULTIMO_MTIME = mtime
+    _FUNCION_EN_CACHE = _resolver_resumir_desfases(modulo)
+    return _FUNCION_EN_CACHE
+
 
-    modulo = importlib.reload(_peak_matching)
+def _resolver_resumir_desfases(modulo) -> Callable[..., Dict[str, object]]:
     funcion = getattr(modulo, "resumir_desfases", None)
     if callable(funcion):
         return funcion
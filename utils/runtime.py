@@ -2,16 +2,31 @@
 
 from __future__ import annotations
 
-import streamlit as st
+# ``streamlit.runtime.exists`` se resuelve en la primera consulta: importar este módulo
+# no carga Streamlit.
+_EXISTE_RUNTIME = None
+
+# Una vez creado, el runtime de Streamlit vive lo mismo que el proceso: basta con
+# confirmarlo una vez en lugar de consultarlo en cada componente de cada rerun.
+_RUNTIME_CONFIRMADO = False
 
 
 def runtime_activo() -> bool:
     """Indica si la app se está ejecutando dentro del runtime de Streamlit."""
 
+    global _EXISTE_RUNTIME, _RUNTIME_CONFIRMADO
+    if _RUNTIME_CONFIRMADO:
+        return True
+
     try:
-        return st.runtime.exists()
+        if _EXISTE_RUNTIME is None:
+            import streamlit as st  # importación perezosa
+
+            _EXISTE_RUNTIME = st.runtime.exists
+        _RUNTIME_CONFIRMADO = bool(_EXISTE_RUNTIME())
     except Exception:  # pragma: no cover - protección ante cambios de API
         return False
+    return _RUNTIME_CONFIRMADO
 
 
 __all__ = ["runtime_activo"]
@@ -9,8 +9,9 @@ en las distintas páginas sin repetir código HTML.
 from __future__ import annotations
 
 import html
-import re
-from typing import Iterable, Mapping, Sequence
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Final, Iterable, List, Mapping, Sequence, Tuple, TypeVar
 from urllib.parse import quote
 
 import streamlit as st
@@ -20,325 +21,305 @@ from .runtime import runtime_activo
 
 _runtime_activo = runtime_activo
 
+_T = TypeVar("_T")
+
+# La hoja de estilos se lee una vez al importar el módulo, no en cada rerun.
+_RUTA_CSS = Path(__file__).parent / "static" / "sincronia.css"
+_CSS_GLOBAL: Final[str] = f"<style>\n{_RUTA_CSS.read_text(encoding='utf-8')}</style>"
+
+
+def _esc(texto: object) -> str:
+    """Escapa ``texto`` para insertarlo en HTML."""
+
+    return html.escape(str(texto))
+
+
+# Plantillas HTML precompiladas; se rellenan con ``str.format_map`` en cada render.
+_PLANTILLA_ENCABEZADO = (
+    '<div class="sincronia-hero">\n'
+    '    <div class="sincronia-hero-icon">{emoji}</div>\n'
+    '    <div class="sincronia-hero-body">\n'
+    "        <h1>{titulo}</h1>\n"
+    "        {descripcion}\n"
+    "    </div>\n"
+    "</div>"
+)
+_PLANTILLA_DELTA = "<p class='metric-delta {tipo}'>{indicador} {texto}</p>"
+_DELTA_INDICADORES: Final[Mapping[str, str]] = {
+    "positive": "🟢",
+    "negative": "🔻",
+    "neutral": "ℹ️",
+}
+_PLANTILLA_DESCRIPCION = "<p class='metric-description'>{descripcion}</p>"
+_PLANTILLA_TARJETA_INFO = (
+    '<div class="sincronia-info-card">\n'
+    '    <div class="sincronia-info-icon">{icono}</div>\n'
+    "    <h3>{titulo}</h3>\n"
+    "    <p>{descripcion}</p>\n"
+    "    {boton}\n"
+    "</div>"
+)
+_PLANTILLA_BOTON = '<a class="sincronia-card-button" href="/{ruta}">{icono} {texto}</a>'
+
 
 def aplicar_estilos_generales() -> None:
-    """Inyecta estilos globales una sola vez por sesión de Streamlit.
+    """Inyecta los estilos globales en la página actual.
 
-    Se utiliza ``st.session_state`` para evitar que el bloque CSS se
-    duplique en cada reinvocación de la página.
+    El bloque CSS se lee una sola vez al importar el módulo (``_CSS_GLOBAL``). Se escribe
+    en cada rerun porque Streamlit descarta los elementos que una ejecución no vuelve a
+    emitir.
     """
 
     if not _runtime_activo():
         return
 
-    clave_estado = "_estilos_sincronia_aplicados"
-    if not st.session_state.get(clave_estado):
-        st.session_state[clave_estado] = True
+    st.markdown(_CSS_GLOBAL, unsafe_allow_html=True)
 
-    st.markdown(
-        """
-        <style>
-            :root {
-                --sincronia-primary: #005d8f;
-                --sincronia-primary-light: #0f8ecf;
-                --sincronia-bg-soft: #f2f7fb;
-            }
-
-            .block-container {
-                padding-top: 2.2rem !important;
-                padding-bottom: 3rem !important;
-                max-width: 1200px;
-            }
 
-            .sincronia-hero {
-                background: linear-gradient(135deg, rgba(0, 93, 143, 0.12), rgba(15, 142, 207, 0.28));
-                border: 1px solid rgba(0, 93, 143, 0.12);
-                border-radius: 20px;
-                padding: 1.8rem 2rem;
-                margin-bottom: 1rem;
-                display: flex;
-                gap: 1.2rem;
-                align-items: center;
-                box-shadow: 0 12px 28px rgba(0, 0, 0, 0.04);
-            }
+def _envolver_delimitados(texto: str, delimitador: str, etiqueta: str) -> str:
+    """Envuelve en ``etiqueta`` cada tramo entre pares de ``delimitador``.
 
-            .sincronia-hero-icon {
-                font-size: 2.8rem;
-            }
+    Equivale a ``re.sub(r"<d>(.+?)<d>", ...)`` sobre el texto antes de convertir los
+    saltos de línea: el tramo no puede estar vacío ni cruzar un ``<br>``, y los pares se
+    toman de izquierda a derecha sin solaparse. Tras el escape, ``<br>`` es la única
+    etiqueta que puede aparecer en ``texto``.
+    """
 
-            .sincronia-hero-body h1 {
-                font-size: clamp(1.8rem, 3vw, 2.4rem);
-                margin-bottom: 0.4rem;
-                color: #03344f;
-            }
+    largo = len(delimitador)
+    partes = []
+    inicio = 0
+    apertura = texto.find(delimitador)
+    while apertura != -1:
+        cierre = texto.find(delimitador, apertura + largo + 1)
+        if cierre == -1:
+            break
+        salto = texto.find("<br>", apertura + largo, cierre)
+        if salto != -1:
+            # Ninguna apertura anterior al salto puede cerrarse sin cruzarlo.
+            apertura = texto.find(delimitador, salto + 1)
+            continue
+        partes.append(texto[inicio:apertura])
+        partes.append(f"<{etiqueta}>{texto[apertura + largo:cierre]}</{etiqueta}>")
+        inicio = cierre + largo
+        apertura = texto.find(delimitador, inicio)
+    if not partes:
+        return texto
+    partes.append(texto[inicio:])
+    return "".join(partes)
+
+
+@lru_cache(maxsize=512)
+def _render_texto_rico(texto: str) -> str:
+    """Convierte un subconjunto sencillo de Markdown a HTML seguro.
 
-            body, p, li, label, .stMarkdown p, .stMarkdown li {
-                font-size: 1.04rem;
-                line-height: 1.6;
-            }
+    Es una función pura de ``texto``: los títulos y descripciones se repiten en cada
+    rerun, así que a partir del segundo render cada texto se resuelve con una búsqueda.
+    """
 
-            .sincronia-hero-body p {
-                margin: 0;
-                font-size: 1.08rem;
-                line-height: 1.55;
-                color: #1f2a33;
-            }
+    texto_escape = _esc(texto)
+    if "\n" in texto_escape:
+        texto_escape = texto_escape.replace("\n", "<br>")
+    if "*" not in texto_escape:
+        # Sin asteriscos no hay marcas que convertir (el caso de casi todos los textos).
+        return texto_escape
+    # ``**`` va antes que ``*`` para que la negrita no se lea como dos cursivas.
+    texto_escape = _envolver_delimitados(texto_escape, "**", "strong")
+    return _envolver_delimitados(texto_escape, "*", "em")
 
-            .sincronia-metric-card {
-                background: white;
-                border-radius: 16px;
-                padding: 1.2rem 1.4rem;
-                border: 1px solid rgba(3, 52, 79, 0.08);
-                box-shadow: 0 10px 24px rgba(3, 52, 79, 0.06);
-                display: flex;
-                flex-direction: column;
-                gap: 0.35rem;
-                margin-bottom: 1rem;
-            }
 
-            .sincronia-metric-card .stMetric {
-                background: transparent;
-            }
+def mostrar_encabezado(titulo: str, descripcion: str, emoji: str = "") -> None:
+    """Renderiza un encabezado tipo *hero* con icono y descripción."""
 
-            .sincronia-metric-card .metric-delta {
-                font-size: 0.85rem;
-                margin: 0;
-            }
+    if not _runtime_activo():
+        return
 
-            .sincronia-metric-card .metric-delta.neutral {
-                color: #315b7d;
-            }
+    titulo_html = _render_texto_rico(str(titulo))
+    descripcion_html = _render_texto_rico(str(descripcion)) if descripcion else ""
+    emoji_html = _esc(emoji)
 
-            .sincronia-metric-card .metric-delta.positive {
-                color: #207a3c;
+    st.markdown(
+        _PLANTILLA_ENCABEZADO.format_map(
+            {
+                "emoji": emoji_html,
+                "titulo": titulo_html,
+                "descripcion": f"<p>{descripcion_html}</p>" if descripcion_html else "",
             }
+        ),
+        unsafe_allow_html=True,
+    )
 
-            .sincronia-metric-card .metric-delta.negative {
-                color: #ba1a1a;
-            }
 
-            .sincronia-metric-card .metric-description {
-                color: #485a6b;
-                font-size: 0.88rem;
-                margin: 0;
-                line-height: 1.45;
-            }
+def _cuadricula(elementos: Sequence[_T], columnas: int) -> List[Tuple[Any, _T]]:
+    """Crea de una vez la disposición en columnas y empareja cada celda con su elemento.
 
-            .sincronia-info-card {
-                background: var(--sincronia-bg-soft);
-                border-radius: 16px;
-                padding: 1.2rem 1.4rem;
-                border: 1px solid rgba(0, 93, 143, 0.12);
-                box-shadow: inset 0 0 0 1px rgba(255, 255, 255, 0.4);
-                height: 100%;
-                display: flex;
-                flex-direction: column;
-                gap: 0.6rem;
-            }
+    Si todo cabe en una fila basta un solo ``st.columns``. Si no, cada fila se crea con
+    tantas columnas como elementos tenga (la última puede ser más corta), todas antes
+    de empezar a llenarlas.
+    """
 
-            .sincronia-info-card h3 {
-                margin-top: 0.6rem;
-                margin-bottom: 0.4rem;
-                font-size: 1.05rem;
-                color: #03344f;
-            }
+    total = len(elementos)
+    if total <= columnas:
+        return list(zip(st.columns(total), elementos))
 
-            .sincronia-info-card p {
-                margin: 0;
-                color: #334655;
-                font-size: 1.02rem;
-                line-height: 1.5;
-            }
+    # Un solo iterador recorre los elementos sin crear rebanadas por fila: ``zip`` agota
+    # primero las columnas de la fila y se detiene sin consumir el elemento siguiente.
+    iterador = iter(elementos)
+    celdas: List[Tuple[Any, _T]] = []
+    for inicio in range(0, total, columnas):
+        celdas.extend(zip(st.columns(min(columnas, total - inicio)), iterador))
+    return celdas
 
-            .sincronia-info-card .sincronia-info-icon {
-                font-size: 1.8rem;
-            }
 
-            .sincronia-info-card .sincronia-card-button {
-                align-self: flex-start;
-                display: inline-flex;
-                align-items: center;
-                gap: 0.35rem;
-                padding: 0.45rem 0.95rem;
-                border-radius: 999px;
-                background: var(--sincronia-primary);
-                color: #ffffff !important;
-                font-weight: 600;
-                font-size: 0.98rem;
-                text-decoration: none !important;
-                box-shadow: 0 6px 16px rgba(0, 93, 143, 0.18);
-                transition: transform 0.15s ease, box-shadow 0.15s ease,
-                    background 0.15s ease;
-            }
+def mostrar_tarjetas_metricas(
+    metricas: Iterable[Mapping[str, object]], *, rich: bool = False
+) -> None:
+    """Muestra una cuadrícula de tarjetas con métricas clave.
 
-            .sincronia-info-card .sincronia-card-button:hover {
-                transform: translateY(-1px);
-                background: var(--sincronia-primary-light);
-                box-shadow: 0 10px 24px rgba(15, 142, 207, 0.28);
-            }
+    Cada métrica debe incluir al menos las llaves ``titulo``, ``valor`` y
+    ``descripcion``. Opcionalmente puede contener ``icono`` y una
+    estructura ``delta`` con ``texto`` y ``tipo`` (`positive`,
+    `negative` o `neutral`). Las descripciones se muestran como texto
+    plano; con ``rich=True`` se interpretan ``**negritas**``, ``*cursivas*``
+    y saltos de línea.
+    """
 
-            .stTabs [data-baseweb="tab-list"] {
-                gap: 0.6rem;
-            }
+    if not _runtime_activo():
+        return
 
-            .stTabs [data-baseweb="tab"] {
-                background: rgba(3, 52, 79, 0.06);
-                border-radius: 999px;
-                padding: 0.4rem 1.2rem;
-            }
+    formatear = _render_texto_rico if rich else _esc
 
-            .stTabs [data-baseweb="tab"][aria-selected="true"] {
-                background: rgba(0, 93, 143, 0.18);
-                color: #03344f;
-                font-weight: 600;
-            }
-        </style>
-        """,
-        unsafe_allow_html=True,
+    # Se materializa una sola vez: un generador no admite ``len`` ni un segundo recorrido.
+    # Listas y tuplas ya lo permiten y se usan sin copiarlas.
+    metricas_secuencia: Sequence[Mapping[str, object]] = (
+        metricas if isinstance(metricas, (list, tuple)) else list(metricas)
     )
+    total = len(metricas_secuencia)
+    if total == 0:
+        return
 
+    columnas = min(3, total)
+
+    for col, metric in _cuadricula(metricas_secuencia, columnas):
+        icono = metric.get("icono") or ""
+        titulo = str(metric.get("titulo", ""))
+        valor = str(metric.get("valor", ""))
+        descripcion = metric.get("descripcion")
+        delta = metric.get("delta")
+        if isinstance(delta, Mapping) and delta:
+            delta_texto = str(delta.get("texto", ""))
+            delta_tipo = delta.get("tipo", "").lower().strip()
+        else:
+            delta_texto = ""
+            delta_tipo = ""
+
+        with col:
+            etiqueta = f"{icono} {titulo}".strip()
+            delta_para_metric = delta_texto if delta_tipo in {"positive", "negative"} else None
+            st.metric(label=etiqueta or " ", value=valor, delta=delta_para_metric)
+
+            # Delta y descripción van en un solo bloque HTML: un ``st.markdown`` por tarjeta.
+            partes_html = ["<div class='sincronia-metric-card'>"]
+            if delta_texto:
+                indicador = _DELTA_INDICADORES.get(delta_tipo or "neutral", "ℹ️")
+                partes_html.append(
+                    _PLANTILLA_DELTA.format_map(
+                        {
+                            "tipo": delta_tipo or "neutral",
+                            "indicador": indicador,
+                            "texto": _esc(delta_texto),
+                        }
+                    )
+                )
 
-def _render_texto_rico(texto: str) -> str:
-    """Convierte un subconjunto sencillo de Markdown a HTML seguro."""
+            if descripcion:
+                partes_html.append(
+                    _PLANTILLA_DESCRIPCION.format_map(
+                        {"descripcion": formatear(str(descripcion))}
+                    )
+                )
 
-    texto_escape = html.escape(texto)
-    texto_escape = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", texto_escape)
-    texto_escape = re.sub(r"\*(.+?)\*", r"<em>\1</em>", texto_escape)
-    return texto_escape.replace("\n", "<br>")
+            partes_html.append("</div>")
+            st.markdown("".join(partes_html), unsafe_allow_html=True)
 
 
-def mostrar_encabezado(titulo: str, descripcion: str, emoji: str = "") -> None:
-    """Renderiza un encabezado tipo *hero* con icono y descripción."""
+@lru_cache(maxsize=128)
+def _ruta_segura(enlace: str) -> str:
+    """Ruta de la página codificada para ``href``; los enlaces se repiten entre reruns."""
 
-    if not _runtime_activo():
-        return
+    return quote(enlace.lstrip("/"))
 
-    titulo_html = _render_texto_rico(titulo)
-    descripcion_html = _render_texto_rico(descripcion) if descripcion else ""
-    emoji_html = html.escape(emoji)
 
-    st.markdown(
-        f"""
-        <div class="sincronia-hero">
-            <div class="sincronia-hero-icon">{emoji_html}</div>
-            <div class="sincronia-hero-body">
-                <h1>{titulo_html}</h1>
-                {f"<p>{descripcion_html}</p>" if descripcion_html else ""}
-            </div>
-        </div>
-        """,
-        unsafe_allow_html=True,
+def _armar_tarjeta_info(tarjeta: Mapping[str, object], rich: bool) -> str:
+    """HTML de una tarjeta descriptiva."""
+
+    formatear = _render_texto_rico if rich else _esc
+    enlace_raw = tarjeta.get("enlace")
+    enlace = str(enlace_raw).strip() if enlace_raw else ""
+    texto_boton_raw = tarjeta.get("texto_boton")
+    texto_boton = str(texto_boton_raw) if texto_boton_raw is not None else "Explorar"
+
+    boton_html = ""
+    if enlace:
+        boton_html = _PLANTILLA_BOTON.format_map(
+            {
+                "ruta": _ruta_segura(enlace),
+                "icono": _esc(tarjeta.get("icono_boton", "➡️")),
+                "texto": _esc(texto_boton),
+            }
+        )
+
+    return _PLANTILLA_TARJETA_INFO.format_map(
+        {
+            "icono": _esc(tarjeta.get("icono", "")),
+            "titulo": formatear(str(tarjeta.get("titulo", ""))),
+            "descripcion": formatear(str(tarjeta.get("descripcion", ""))),
+            "boton": boton_html,
+        }
     )
 
 
-def mostrar_tarjetas_metricas(metricas: Iterable[Mapping[str, object]]) -> None:
-    """Muestra una cuadrícula de tarjetas con métricas clave.
+@lru_cache(maxsize=128)
+def _tarjeta_info_en_cache(campos: Tuple[Tuple[str, object], ...], rich: bool) -> str:
+    return _armar_tarjeta_info(dict(campos), rich)
 
-    Cada métrica debe incluir al menos las llaves ``titulo``, ``valor`` y
-    ``descripcion``. Opcionalmente puede contener ``icono`` y una
-    estructura ``delta`` con ``texto`` y ``tipo`` (`positive`,
-    `negative` o `neutral`).
-    """
 
-    if not _runtime_activo():
-        return
+def _html_tarjeta_info(tarjeta: Mapping[str, object], rich: bool) -> str:
+    """HTML de una tarjeta descriptiva, memorizado por su contenido.
 
-    if not metricas:
-        return
+    Los catálogos de tarjetas suelen ser estáticos: tras el primer rerun cada tarjeta se
+    resuelve con una búsqueda. ``st.cache_data`` no sirve aquí: hashear y copiar su
+    resultado cuesta varias veces más que armar el HTML.
+    """
 
-    columnas = min(3, len(metricas))
-
-    metricas_secuencia: Sequence[Mapping[str, object]] = list(metricas)
-
-    for indice_inicio in range(0, len(metricas_secuencia), columnas):
-        fila = metricas_secuencia[indice_inicio : indice_inicio + columnas]
-        cols = st.columns(len(fila))
-
-        for col, metric in zip(cols, fila):
-            icono = metric.get("icono") or ""
-            titulo = str(metric.get("titulo", ""))
-            valor = str(metric.get("valor", ""))
-            descripcion = metric.get("descripcion")
-            delta = metric.get("delta") if isinstance(metric.get("delta"), Mapping) else None
-            delta_texto = str(delta.get("texto", "")) if delta else ""
-            delta_tipo = (delta.get("tipo", "").lower() if delta else "").strip()
-
-            with col:
-                with st.container():
-                    st.markdown("<div class='sincronia-metric-card'>", unsafe_allow_html=True)
-                    etiqueta = f"{icono} {titulo}".strip()
-                    delta_para_metric = delta_texto if delta_tipo in {"positive", "negative"} else None
-                    st.metric(label=etiqueta or " ", value=valor, delta=delta_para_metric)
-
-                    if delta_texto:
-                        indicador = {
-                            "positive": "🟢",
-                            "negative": "🔻",
-                            "neutral": "ℹ️",
-                        }.get(delta_tipo or "neutral", "ℹ️")
-                        st.markdown(
-                            f"<p class='metric-delta {delta_tipo or 'neutral'}'>{indicador} {html.escape(delta_texto)}</p>",
-                            unsafe_allow_html=True,
-                        )
-
-                    if descripcion:
-                        st.markdown(
-                            f"<p class='metric-description'>{_render_texto_rico(str(descripcion))}</p>",
-                            unsafe_allow_html=True,
-                        )
-
-                    st.markdown("</div>", unsafe_allow_html=True)
+    try:
+        return _tarjeta_info_en_cache(tuple(tarjeta.items()), rich)
+    except TypeError:  # algún valor no es hashable
+        return _armar_tarjeta_info(tarjeta, rich)
 
 
 def mostrar_tarjetas_descriptivas(
-    tarjetas: Iterable[Mapping[str, object]], *, columnas: int = 3
+    tarjetas: Iterable[Mapping[str, object]], *, columnas: int = 3, rich: bool = False
 ) -> None:
-    """Renderiza tarjetas de texto para resúmenes o listados de herramientas."""
+    """Renderiza tarjetas de texto para resúmenes o listados de herramientas.
+
+    Títulos y descripciones se muestran como texto plano; con ``rich=True`` se
+    interpretan ``**negritas**``, ``*cursivas*`` y saltos de línea.
+    """
 
     if not _runtime_activo():
         return
 
-    tarjetas_lista: Sequence[Mapping[str, object]] = list(tarjetas)
+    tarjetas_lista: Sequence[Mapping[str, object]] = (
+        tarjetas if isinstance(tarjetas, (list, tuple)) else list(tarjetas)
+    )
     if not tarjetas_lista:
         return
 
     columnas = max(1, min(columnas, 3))
 
-    for indice_inicio in range(0, len(tarjetas_lista), columnas):
-        fila = tarjetas_lista[indice_inicio : indice_inicio + columnas]
-        cols = st.columns(len(fila))
-
-        for col, tarjeta in zip(cols, fila):
-            icono = html.escape(str(tarjeta.get("icono", "")))
-            titulo = _render_texto_rico(str(tarjeta.get("titulo", "")))
-            descripcion = _render_texto_rico(str(tarjeta.get("descripcion", "")))
-            enlace_raw = tarjeta.get("enlace")
-            enlace = str(enlace_raw).strip() if enlace_raw else ""
-            texto_boton_raw = tarjeta.get("texto_boton")
-            texto_boton = str(texto_boton_raw) if texto_boton_raw is not None else "Explorar"
-            icono_boton = html.escape(str(tarjeta.get("icono_boton", "➡️")))
-
-            boton_html = ""
-            if enlace:
-                ruta = quote(enlace.lstrip("/"))
-                boton_html = (
-                    f"<a class=\"sincronia-card-button\" href=\"/{ruta}\">"
-                    f"{icono_boton} {html.escape(texto_boton)}"
-                    "</a>"
-                )
-
-            with col:
-                st.markdown(
-                    f"""
-                    <div class="sincronia-info-card">
-                        <div class="sincronia-info-icon">{icono}</div>
-                        <h3>{titulo}</h3>
-                        <p>{descripcion}</p>
-                        {boton_html}
-                    </div>
-                    """,
-                    unsafe_allow_html=True,
-                )
+    for col, tarjeta in _cuadricula(tarjetas_lista, columnas):
+        with col:
+            st.markdown(_html_tarjeta_info(tarjeta, rich), unsafe_allow_html=True)
 
 
 __all__ = [